@@ -0,0 +1,71 @@
+"""Fixed-size avatar renditions.
+
+The uploaded original is kept but never linked from a page. After each upload
+a job decodes it once, crops it to a square and writes one small image per
+entry in ``RENDITIONS``. The output is WebP, or JPEG when Pillow was built
+without WebP. Pillow only writes EXIF, ICC and XMP data when asked to, so
+the renditions carry none of the original's metadata (camera, GPS, ...).
+"""
+import io
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# model field -> edge length in pixels
+RENDITIONS = {"avatar_thumb": 64, "avatar_medium": 256}
+
+
+def _output_format():
+    return ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+
+
+def _render(user) -> dict:
+    fmt, ext = _output_format()
+    largest = max(RENDITIONS.values())
+    names = {}
+    with user.avatar.open("rb") as f, Image.open(f) as img:
+        # JPEGs can decode straight to a reduced scale, which is most of the work for big photos.
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if fmt == "WEBP" and img.mode in ("RGBA", "LA", "P") else "RGB")
+        for field_name, size in RENDITIONS.items():
+            thumb = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            thumb.save(buf, fmt, quality=82)
+            field = User._meta.get_field(field_name)
+            name = field.generate_filename(user, f"{user.pk}-{size}{ext}")
+            names[field_name] = field.storage.save(name, ContentFile(buf.getvalue()))
+    return names
+
+
+def render_avatar_renditions(user_id, avatar_name):
+    """(Re)build a user's renditions for ``avatar_name``, or clear them if it is empty.
+
+    Does nothing if the user has uploaded another avatar since the job was queued
+    or while it ran.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or (user.avatar.name or "") != (avatar_name or ""):
+        return
+    old = {getattr(user, f).name for f in RENDITIONS} - {""}
+    new = dict.fromkeys(RENDITIONS, "")
+    if avatar_name:
+        try:
+            new = _render(user)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning("Could not render avatar renditions for user %s", user_id, exc_info=True)
+    storage = User._meta.get_field("avatar_thumb").storage
+    # Only this avatar's renditions are written; a newer upload during the render wins,
+    # and its own job produces the renditions that go with it.
+    if not User.objects.filter(pk=user_id, avatar=avatar_name).update(**new):
+        for name in set(new.values()) - old - {""}:
+            storage.delete(name)
+        return
+    for name in old - set(new.values()):
+        storage.delete(name)
@@ -17,3 +17,11 @@ class ProfileForm(forms.ModelForm):
         model = User
         fields = ["first_name","last_name","bio","location","website_url",
                   "expertise","avatar","social_twitter","social_linkedin"]
+
+    def save(self, commit=True):
+        # Write only the form's columns: the renditions are set by the avatar job,
+        # and this instance may hold copies of them from before that job finished.
+        user = super().save(commit=False)
+        if commit:
+            user.save(update_fields=self._meta.fields)
+        return user
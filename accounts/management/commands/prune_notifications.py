@@ -0,0 +1,59 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Notification
+
+ARCHIVE_FIELDS = ("id", "recipient_id", "actor_id", "verb", "url", "count", "created_at", "read_at")
+
+
+class Command(BaseCommand):
+    help = "Delete (optionally archiving) read notifications older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90))
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.05,
+                            help="Pause between batches so writers can get the lock.")
+        parser.add_argument("--archive", metavar="PATH",
+                            help="Append pruned rows to this JSON Lines file before deleting them.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(days=opts["days"])
+        stale = Notification.objects.filter(read_at__isnull=False, created_at__lt=cutoff).order_by("id")
+
+        if opts["dry_run"]:
+            self.stdout.write(f"{stale.count()} notification(s) would be pruned.")
+            return
+
+        archive = open(opts["archive"], "a", encoding="utf-8") if opts["archive"] else None
+        total = 0
+        last_id = 0
+        try:
+            while True:
+                # Walk the primary key so each batch starts where the last one ended.
+                ids = list(stale.filter(id__gt=last_id).values_list("id", flat=True)[: opts["batch_size"]])
+                if not ids:
+                    break
+                last_id = ids[-1]
+                with transaction.atomic():
+                    if archive:
+                        for row in Notification.objects.filter(pk__in=ids).order_by("id").values(*ARCHIVE_FIELDS):
+                            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                        archive.flush()
+                    deleted, _ = Notification.objects.filter(pk__in=ids).delete()
+                total += deleted
+                if opts["sleep"]:
+                    time.sleep(opts["sleep"])
+        finally:
+            if archive:
+                archive.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {total} notification(s) older than {opts['days']} days."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from accounts.avatars import render_avatar_renditions
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = "Build avatar renditions for users who have an avatar but no renditions yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-render every avatar, not just missing ones.")
+
+    def handle(self, *args, **opts):
+        users = User.objects.exclude(Q(avatar="") | Q(avatar__isnull=True))
+        if not opts["all"]:
+            users = users.filter(avatar_thumb="")
+        total = 0
+        for user_id, avatar in users.order_by("id").values_list("id", "avatar").iterator(chunk_size=200):
+            render_avatar_renditions(user_id, avatar)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered avatars for {total} user(s)."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='avatars/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumb',
+            field=models.ImageField(blank=True, editable=False, upload_to='avatars/renditions/'),
+        ),
+    ]
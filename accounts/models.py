@@ -1,6 +1,6 @@
 # accounts/models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError 
 from django.utils import timezone
@@ -15,6 +15,10 @@ class User(AbstractUser):
     website_url = models.URLField(blank=True)
     expertise = models.CharField(max_length=200, blank=True)   
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    # Small, metadata-free renditions of ``avatar`` written by accounts.avatars;
+    # pages link these, never the original upload.
+    avatar_thumb = models.ImageField(upload_to="avatars/renditions/", blank=True, editable=False)
+    avatar_medium = models.ImageField(upload_to="avatars/renditions/", blank=True, editable=False)
     social_twitter = models.URLField(blank=True)
     social_linkedin = models.URLField(blank=True)
 
@@ -58,19 +62,50 @@ class Notification(models.Model):
     url = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
+    # Coalesced notifications: events sharing a group_key within a time window
+    # are folded into one row with a running count and a few sample actors.
+    group_key = models.CharField(max_length=40, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    actor_sample = models.JSONField(default=list, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["recipient", "group_key", "created_at"]),
+            models.Index(fields=["recipient", "read_at"], name="notif_recipient_read_idx"),
+            models.Index(fields=["recipient", "created_at"], name="notif_recipient_created_idx"),
+        ]
 
     @property
     def is_read(self) -> bool:
         return self.read_at is not None
 
     def mark_read(self):
-        if not self.read_at:
-            self.read_at = timezone.now()
-            self.save(update_fields=["read_at"])
+        from .notify import _push_on_commit
+
+        if self.read_at:
+            return
+        self.read_at = timezone.now()
+        with transaction.atomic():
+            # Conditional, so two requests marking the same row only decrement once.
+            if not Notification.objects.filter(pk=self.pk, read_at__isnull=True).update(read_at=self.read_at):
+                return
+            UnreadCounter.objects.filter(user_id=self.recipient_id, unread__gt=0).update(
+                unread=models.F("unread") - 1
+            )
+        _push_on_commit([[self.recipient_id, {}]])
 
     def __str__(self):
         who = getattr(self.recipient, "username", "user")
         return f"To {who}: {self.verb}"
+
+
+class UnreadCounter(models.Model):
+    """Denormalised count of a user's unread notifications."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="unread_counter"
+    )
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
@@ -1,21 +1,205 @@
+import asyncio
+import hashlib
+from datetime import timedelta
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from .models import Notification
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from jobs.queue import enqueue, job
+from .models import Notification, UnreadCounter
 
-def create_and_push(recipient, verb: str, url: str = "", actor=None):
-    notif = Notification.objects.create(
-        recipient=recipient, actor=actor, verb=verb, url=url or ""
-    )
-    payload = {
+PUSH_CONCURRENCY = 100
+
+
+def _payload(notif) -> dict:
+    return {
         "id": notif.id,
         "verb": notif.verb,
         "url": notif.url,
         "created_at": notif.created_at.isoformat(),
-        "unread_increment": 1,
+        "count": notif.count,
     }
+
+
+def unread_counts(user_ids) -> dict:
+    """Unread counts for ``user_ids`` from the counter table.
+
+    Users without a counter row yet get one at zero, which ``_bump_unread``
+    starts adding to straight away; whoever created the row then adds the
+    COUNT(*) of unread notifications on top, rather than overwriting it.
+    """
+    user_ids = set(user_ids)
+    counts = dict(UnreadCounter.objects.filter(user_id__in=user_ids).values_list("user_id", "unread"))
+    missing = user_ids - counts.keys()
+    if missing:
+        created = {uid for uid in missing if UnreadCounter.objects.get_or_create(user_id=uid)[1]}
+        existing = dict(
+            Notification.objects.filter(recipient_id__in=created, read_at__isnull=True)
+            .values_list("recipient_id")
+            .annotate(n=Count("id"))
+        )
+        for uid, n in existing.items():
+            UnreadCounter.objects.filter(user_id=uid).update(unread=F("unread") + n)
+        counts.update(UnreadCounter.objects.filter(user_id__in=missing).values_list("user_id", "unread"))
+    return counts
+
+
+def unread_count(user_id) -> int:
+    return unread_counts([user_id])[user_id]
+
+
+def _bump_unread(user_ids, delta=1):
+    # Users without a counter row yet are seeded from COUNT(*) on their next read.
+    UnreadCounter.objects.filter(user_id__in=user_ids).update(unread=F("unread") + delta)
+
+
+def _push_on_commit(messages):
+    """Push from this process once the transaction commits.
+
+    The web process owns the websockets, so its ``group_send`` reaches them
+    even on the in-memory channel layer; a queued job would only do so with a
+    shared layer and a running worker.
+    """
+    transaction.on_commit(lambda: push_many(messages))
+
+
+def create_and_push(recipient, verb: str, url: str = "", actor=None):
+    with transaction.atomic():
+        notif = Notification.objects.create(
+            recipient=recipient, actor=actor, verb=verb, url=url or ""
+        )
+        _bump_unread([recipient.id])
+    _push_on_commit([[recipient.id, _payload(notif)]])
+    return notif
+
+
+def mark_all_read(user):
+    with transaction.atomic():
+        Notification.objects.filter(recipient=user, read_at__isnull=True).update(read_at=timezone.now())
+        UnreadCounter.objects.update_or_create(user=user, defaults={"unread": 0})
+    _push_on_commit([[user.id, {}]])
+
+
+def push_many(messages):
+    """Send ``[user_id, payload]`` pairs over the channel layer in one event-loop hop."""
+    messages = list(messages)
+    if not messages:
+        return
+    # Every push carries the recipient's fresh unread count for the badge.
+    counts = unread_counts(uid for uid, _ in messages)
+    for uid, payload in messages:
+        payload["unread_count"] = counts[uid]
     channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{recipient.id}",
-        {"type": "notify", "payload": payload},
-    )
+
+    async def _send_all():
+        for i in range(0, len(messages), PUSH_CONCURRENCY):
+            await asyncio.gather(*(
+                channel_layer.group_send(f"user_{uid}", {"type": "notify", "payload": payload})
+                for uid, payload in messages[i:i + PUSH_CONCURRENCY]
+            ))
+
+    async_to_sync(_send_all)()
+
+
+def bulk_create_and_push(recipient_ids, verb: str, url: str = "", actor=None, actor_id=None,
+                         batch_size: int = 500):
+    """Fan one notification out to many users.
+
+    Rows are written with ``bulk_create``; the websocket pushes go out in one
+    batch once the surrounding transaction commits.
+    """
+    recipient_ids = list(recipient_ids)
+    with transaction.atomic():
+        notifs = Notification.objects.bulk_create(
+            [
+                Notification(recipient_id=rid, actor_id=actor.pk if actor else actor_id, verb=verb, url=url or "")
+                for rid in recipient_ids
+            ],
+            batch_size=batch_size,
+        )
+        _bump_unread(recipient_ids)
+    _push_on_commit([[n.recipient_id, _payload(n)] for n in notifs])
+    return notifs
+
+
+ACTOR_SAMPLE_SIZE = 3
+
+
+def _group_key(verb_template: str, url: str) -> str:
+    return hashlib.sha1(f"{verb_template}|{url}".encode()).hexdigest()
+
+
+def _render_actors(sample, count) -> str:
+    others = count - len(sample)
+    if others > 0:
+        noun = "other" if others == 1 else "others"
+        return f"{', '.join(sample)} and {others} {noun}"
+    if len(sample) > 1:
+        return f"{', '.join(sample[:-1])} and {sample[-1]}"
+    return sample[0] if sample else "Someone"
+
+
+@job
+def push_notification(notification_id):
+    notif = Notification.objects.filter(pk=notification_id).first()
+    if notif is not None:
+        push_many([[notif.recipient_id, _payload(notif)]])
+
+
+def _push_throttled(notif):
+    """Push at most once per interval per group; the last update is sent on the trailing edge.
+
+    The trailing push is delayed, so it is a queued job and needs ``run_jobs``
+    and a shared (Redis) channel layer to reach clients. If it is lost, the
+    next push or a socket reconnect brings the badge up to date.
+    """
+    interval = getattr(settings, "NOTIFICATION_PUSH_INTERVAL", 10)
+    base = f"notif_push:{notif.recipient_id}:{notif.group_key}"
+    if cache.add(base, 1, interval):
+        _push_on_commit([[notif.recipient_id, _payload(notif)]])
+    elif cache.add(f"{base}:trailing", 1, interval):
+        enqueue(push_notification, notif.id, delay=interval)
+
+
+def coalesce_and_push(recipient, verb_template: str, url: str = "", actor=None):
+    """Record an event, folding it into a recent unread notification of the same kind.
+
+    ``verb_template`` contains an ``{actors}`` placeholder, e.g.
+    ``"{actors} enrolled in Physics"``. Events with the same recipient, template
+    and url inside ``NOTIFICATION_COALESCE_WINDOW`` seconds share one row whose
+    verb reads "alice, bob and 3 others enrolled in Physics".
+    """
+    url = url or ""
+    key = _group_key(verb_template, url)
+    name = getattr(actor, "username", None)
+    window = timedelta(seconds=getattr(settings, "NOTIFICATION_COALESCE_WINDOW", 3600))
+
+    with transaction.atomic():
+        notif = (
+            Notification.objects.select_for_update()
+            .filter(recipient=recipient, group_key=key, read_at__isnull=True,
+                    created_at__gte=timezone.now() - window)
+            .order_by("-created_at")
+            .first()
+        )
+        if notif is None:
+            sample = [name] if name else []
+            notif = Notification.objects.create(
+                recipient=recipient, actor=actor, url=url, group_key=key, actor_sample=sample,
+                verb=verb_template.format(actors=_render_actors(sample, 1))[:140],
+            )
+            _bump_unread([recipient.id])
+        else:
+            notif.count += 1
+            if name and name not in notif.actor_sample and len(notif.actor_sample) < ACTOR_SAMPLE_SIZE:
+                notif.actor_sample.append(name)
+            notif.actor = actor
+            notif.verb = verb_template.format(actors=_render_actors(notif.actor_sample, notif.count))[:140]
+            notif.save(update_fields=["count", "actor_sample", "actor", "verb"])
+
+    _push_throttled(notif)
     return notif
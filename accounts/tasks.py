@@ -0,0 +1,8 @@
+from jobs.queue import job
+from .avatars import render_avatar_renditions
+
+
+@job
+def render_avatar(user_id, avatar_name):
+    """Write the small renditions pages show instead of the uploaded avatar."""
+    render_avatar_renditions(user_id, avatar_name)
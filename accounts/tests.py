@@ -1,14 +1,38 @@
-from django.test import TestCase, Client
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
-from accounts.models import Block
+from accounts import avatars
+from accounts.avatars import RENDITIONS, render_avatar_renditions
+from accounts.forms import ProfileForm
+from accounts.models import Block, Notification, UnreadCounter
+from accounts.notify import bulk_create_and_push, coalesce_and_push, create_and_push, unread_count
 from courses.models import Course, Enrollment
+from jobs.models import Job
 
 User = get_user_model()
 
 class AccountsTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.teacher = User.objects.create_user(
             username="teacher1", email="t@example.com", password="pass", role=User.TEACHER
@@ -55,3 +79,316 @@ class AccountsTests(TestCase):
         self.assertFalse(Enrollment.objects.filter(course=course, student=self.student).exists())
 
         self.assertContains(r, "blocked", status_code=200)
+
+
+class BulkNotifyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher1", password="pass", role=User.TEACHER)
+        self.students = [
+            User.objects.create_user(username=f"s{i}", password="pass", role=User.STUDENT) for i in range(3)
+        ]
+
+    def test_bulk_create_and_push_defers_push_until_commit(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.students[0].id}", channel)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notifs = bulk_create_and_push([s.id for s in self.students], verb="Hello", url="/x/", actor=self.teacher)
+        self.assertEqual(len(notifs), 3)
+        self.assertEqual(Notification.objects.filter(verb="Hello", actor=self.teacher).count(), 3)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event["payload"]["verb"], "Hello")
+        self.assertEqual(event["payload"]["id"], notifs[0].id)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_push_is_sent_in_process_without_a_worker(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.students[0].id}", channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_and_push(self.students[0], verb="Direct")
+        self.assertFalse(Job.objects.exists())
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual((event["payload"]["verb"], event["payload"]["unread_count"]), ("Direct", 1))
+
+    def test_material_upload_notifies_every_student(self):
+        course = Course.objects.create(title="Physics", description="Basics", instructor=self.teacher)
+        Enrollment.objects.bulk_create([Enrollment(course=course, student=s) for s in self.students])
+        self.client.login(username="teacher1", password="pass")
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        with self.settings(MEDIA_ROOT=media_root), self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(
+                reverse("material_upload", args=[course.id]),
+                {"title": "Week 1", "upload": SimpleUploadedFile("w1.pdf", b"%PDF-1.4")},
+            )
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Notification.objects.filter(verb__startswith="New material").count(), 3)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher1", password="pass", role=User.TEACHER)
+        self.student = User.objects.create_user(username="student1", password="pass", role=User.STUDENT)
+
+    def test_counter_is_seeded_from_existing_rows(self):
+        Notification.objects.create(recipient=self.student, verb="old")
+        self.assertEqual(unread_count(self.student.id), 1)
+        self.assertEqual(UnreadCounter.objects.get(user=self.student).unread, 1)
+
+    def test_counter_follows_create_and_mark_read(self):
+        self.assertEqual(unread_count(self.student.id), 0)
+        create_and_push(self.student, verb="one")
+        bulk_create_and_push([self.student.id], verb="two")
+        self.assertEqual(unread_count(self.student.id), 2)
+
+        Notification.objects.filter(verb="one").get().mark_read()
+        self.assertEqual(unread_count(self.student.id), 1)
+
+        self.client.login(username="student1", password="pass")
+        self.client.post(reverse("notifications_mark_all_read"))
+        self.assertEqual(unread_count(self.student.id), 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.student, read_at__isnull=True).exists())
+
+    def test_unread_count_endpoint_reads_counter(self):
+        unread_count(self.student.id)
+        create_and_push(self.student, verb="hi")
+        self.client.login(username="student1", password="pass")
+        r = self.client.get(reverse("notifications_unread_count"))
+        self.assertEqual(r.json(), {"count": 1})
+
+    def test_push_carries_unread_count(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.student.id}", channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_and_push(self.student, verb="hi")
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event["payload"]["unread_count"], 1)
+
+    def test_mark_read_pushes_the_new_count_once(self):
+        create_and_push(self.student, verb="hi")
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.student.id}", channel)
+        notif = Notification.objects.get()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            notif.mark_read()
+            Notification.objects.get().mark_read()  # a second request for the same row
+        self.assertEqual(len(callbacks), 1)
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event["payload"], {"unread_count": 0})
+        self.assertEqual(UnreadCounter.objects.get(user=self.student).unread, 0)
+
+    def test_concurrent_seed_is_not_added_twice(self):
+        Notification.objects.create(recipient=self.student, verb="old")
+        real_get_or_create = UnreadCounter.objects.get_or_create
+
+        def seeded_elsewhere_first(**kwargs):
+            # Another request seeded the row (1) and a new notification bumped it (2).
+            UnreadCounter.objects.create(user=self.student, unread=2)
+            return real_get_or_create(**kwargs)
+
+        with patch.object(UnreadCounter.objects, "get_or_create", seeded_elsewhere_first):
+            self.assertEqual(unread_count(self.student.id), 2)
+        self.assertEqual(UnreadCounter.objects.get(user=self.student).unread, 2)
+
+
+class CoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher1", password="pass", role=User.TEACHER)
+        self.students = [
+            User.objects.create_user(username=f"s{i}", password="pass", role=User.STUDENT) for i in range(5)
+        ]
+
+    def test_similar_events_share_one_row(self):
+        for s in self.students:
+            coalesce_and_push(self.teacher, "{actors} enrolled in Physics", url="/1/", actor=s)
+        n = Notification.objects.get(recipient=self.teacher)
+        self.assertEqual(n.count, 5)
+        self.assertEqual(n.actor_sample, ["s0", "s1", "s2"])
+        self.assertEqual(n.verb, "s0, s1, s2 and 2 others enrolled in Physics")
+        self.assertEqual(unread_count(self.teacher.id), 1)
+
+    def test_read_or_expired_groups_start_a_new_row(self):
+        first = coalesce_and_push(self.teacher, "{actors} enrolled in Physics", url="/1/", actor=self.students[0])
+        first.mark_read()
+        second = coalesce_and_push(self.teacher, "{actors} enrolled in Physics", url="/1/", actor=self.students[1])
+        self.assertNotEqual(first.pk, second.pk)
+        Notification.objects.filter(pk=second.pk).update(created_at=timezone.now() - timedelta(days=1))
+        third = coalesce_and_push(self.teacher, "{actors} enrolled in Physics", url="/1/", actor=self.students[2])
+        self.assertNotEqual(second.pk, third.pk)
+        other = coalesce_and_push(self.teacher, "{actors} enrolled in Chemistry", url="/2/", actor=self.students[3])
+        self.assertNotEqual(third.pk, other.pk)
+
+    def test_pushes_are_rate_limited_per_group(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.teacher.id}", channel)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for s in self.students:
+                coalesce_and_push(self.teacher, "{actors} enrolled in Physics", url="/1/", actor=s)
+        # One leading push plus one trailing push carrying the final count.
+        self.assertEqual(len(callbacks), 2)
+        first = async_to_sync(layer.receive)(channel)
+        last = async_to_sync(layer.receive)(channel)
+        self.assertEqual((first["payload"]["count"], last["payload"]["count"]), (1, 5))
+
+    def test_enrollments_coalesce_for_instructor(self):
+        course = Course.objects.create(title="Physics", description="Basics", instructor=self.teacher)
+        for s in self.students[:2]:
+            self.client.login(username=s.username, password="pass")
+            self.client.get(reverse("enroll", args=[course.id]))
+        n = Notification.objects.get(recipient=self.teacher)
+        self.assertEqual(n.verb, "s0 and s1 enrolled in Physics")
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username="student1", password="pass", role=User.STUDENT)
+
+    def test_prune_removes_only_old_read_rows(self):
+        old = timezone.now() - timedelta(days=120)
+        keep_unread = Notification.objects.create(recipient=self.student, verb="old unread")
+        keep_recent = Notification.objects.create(recipient=self.student, verb="new read", read_at=timezone.now())
+        pruned = [
+            Notification.objects.create(recipient=self.student, verb=f"old read {i}", read_at=old) for i in range(3)
+        ]
+        Notification.objects.filter(pk__in=[keep_unread.pk] + [n.pk for n in pruned]).update(created_at=old)
+
+        archive = tempfile.NamedTemporaryFile("r", suffix=".jsonl", delete=False)
+        self.addCleanup(os.unlink, archive.name)
+        call_command("prune_notifications", days=90, batch_size=2, sleep=0, archive=archive.name, stdout=StringIO())
+
+        remaining = set(Notification.objects.values_list("pk", flat=True))
+        self.assertEqual(remaining, {keep_unread.pk, keep_recent.pk})
+        rows = [json.loads(line) for line in archive.read().splitlines()]
+        self.assertEqual([r["id"] for r in rows], [n.pk for n in pruned])
+
+    @skipUnless(connection.vendor == "sqlite", "EXPLAIN output format is SQLite-specific")
+    def test_hot_queries_use_composite_indexes(self):
+        Notification.objects.create(recipient=self.student, verb="hi")
+        self.client.login(username="student1", password="pass")
+        expected = {
+            reverse("notifications_list"): "notif_recipient_created_idx",
+            reverse("notifications_recent_json"): "notif_recipient_created_idx",
+            reverse("notifications_unread_count"): "notif_recipient_read_idx",
+        }
+        for url, index in expected.items():
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            selects = [q["sql"] for q in ctx.captured_queries
+                       if q["sql"].startswith("SELECT") and 'FROM "accounts_notification"' in q["sql"]]
+            self.assertTrue(selects, url)
+            for sql in selects:
+                with connection.cursor() as cur:
+                    cur.execute("EXPLAIN QUERY PLAN " + sql)
+                    plan = " ".join(str(row[-1]) for row in cur.fetchall())
+                self.assertIn(index, plan, f"{url}: {plan}")
+
+
+class AvatarRenditionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.client.login(username="student1", password="pass")
+
+    def photo(self, size=(1200, 800)):
+        img = Image.new("RGB", size, "red")
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCam"  # Make
+        buf = BytesIO()
+        img.save(buf, "JPEG", exif=exif.tobytes())
+        return SimpleUploadedFile("me.jpg", buf.getvalue(), content_type="image/jpeg")
+
+    def upload(self, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("edit_profile"), {"first_name": "Sam", **extra})
+
+    def test_upload_renders_small_metadata_free_renditions(self):
+        self.assertEqual(self.upload(avatar=self.photo()).status_code, 302)
+        self.user.refresh_from_db()
+        for field, size in RENDITIONS.items():
+            with getattr(self.user, field).open("rb") as f, Image.open(f) as img:
+                self.assertEqual(img.size, (size, size))
+                self.assertEqual(img.format, "WEBP")
+                self.assertNotIn("exif", img.info)
+
+        page = self.client.get(reverse("user_profile", args=["student1"]))
+        self.assertContains(page, self.user.avatar_medium.url)
+        self.assertNotContains(page, self.user.avatar.url)
+
+    def test_replacing_and_clearing_avatar_removes_old_renditions(self):
+        self.upload(avatar=self.photo())
+        self.user.refresh_from_db()
+        first = self.user.avatar_thumb
+        self.upload(avatar=self.photo((300, 300)))
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.avatar_thumb.name, first.name)
+        self.assertFalse(first.storage.exists(first.name))
+
+        thumb = self.user.avatar_thumb
+        self.upload(**{"avatar-clear": "on"})
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.avatar_thumb.name, self.user.avatar_medium.name), ("", ""))
+        self.assertFalse(thumb.storage.exists(thumb.name))
+
+    def test_stale_job_is_ignored(self):
+        self.upload(avatar=self.photo())
+        self.user.refresh_from_db()
+        thumb = self.user.avatar_thumb.name
+        render_avatar_renditions(self.user.pk, "avatars/old.jpg")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_thumb.name, thumb)
+
+    def test_avatar_replaced_while_rendering(self):
+        self.upload(avatar=self.photo())
+        self.user.refresh_from_db()
+        before = {f: getattr(self.user, f).name for f in RENDITIONS}
+        written = {}
+
+        def render_then_replace(user):
+            written.update(real_render(user))
+            User.objects.filter(pk=user.pk).update(avatar="avatars/newer.jpg")
+            return written
+
+        real_render = avatars._render
+        with patch.object(avatars, "_render", render_then_replace):
+            render_avatar_renditions(self.user.pk, self.user.avatar.name)
+        self.user.refresh_from_db()
+        self.assertEqual({f: getattr(self.user, f).name for f in RENDITIONS}, before)
+        storage = self.user.avatar_thumb.storage
+        self.assertTrue(all(storage.exists(name) for name in before.values()))
+        self.assertFalse(any(storage.exists(name) for name in written.values()))
+
+    def test_profile_edit_keeps_renditions_written_meanwhile(self):
+        self.upload(avatar=self.photo())
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(avatar_thumb="avatars/renditions/x.webp")
+        form = ProfileForm({"first_name": "Kim"}, instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.avatar_thumb.name), ("Kim", "avatars/renditions/x.webp"))
+
+    def test_backfill_command(self):
+        self.user.avatar = self.photo()
+        self.user.save()
+        out = StringIO()
+        call_command("render_avatars", stdout=out)
+        self.assertIn("1 user(s)", out.getvalue())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar_thumb.name)
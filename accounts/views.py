@@ -11,8 +11,10 @@ from courses.models import Course, Enrollment, StatusUpdate
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, redirect
-from django.utils import timezone
 from .models import Notification
+from .notify import mark_all_read, unread_count
+from .tasks import render_avatar
+from jobs.queue import enqueue
 from django.contrib import messages
 
 User = get_user_model()
@@ -168,8 +170,7 @@ def profile_view(request, username: str):
 
 @login_required
 def notifications_unread_count(request):
-    count = Notification.objects.filter(recipient=request.user, read_at__isnull=True).count()
-    return JsonResponse({"count": count})
+    return JsonResponse({"count": unread_count(request.user.id)})
 
 @login_required
 def notifications_list(request):
@@ -178,7 +179,7 @@ def notifications_list(request):
 
 @login_required
 def notifications_mark_all_read(request):
-    Notification.objects.filter(recipient=request.user, read_at__isnull=True).update(read_at=timezone.now())
+    mark_all_read(request.user)
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({"ok": True})
     return redirect("notifications_list")
@@ -189,7 +190,9 @@ def edit_profile(request):
     if request.method == "POST":
         form = ProfileForm(request.POST, request.FILES, instance=request.user)
         if form.is_valid():
-            form.save()
+            user = form.save()
+            if "avatar" in form.changed_data:
+                enqueue(render_avatar, user.pk, user.avatar.name or "")
             messages.success(request, "Profile updated.")
             return redirect("user_profile", username=request.user.username)
     else:
@@ -202,5 +205,5 @@ def notifications_recent_json(request):
     limit = int(request.GET.get("limit", "10"))
     qs = (request.user.notifications
             .order_by("-created_at")
-            .values("verb", "url")[:limit])
+            .values("id", "verb", "url")[:limit])
     return JsonResponse({"results": list(qs)})
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import CourseDailyStats, RollupWatermark
+
+@admin.register(CourseDailyStats)
+class CourseDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('course', 'day', 'new_enrollments', 'feedback_posts', 'chat_messages', 'active_chatters')
+    list_filter = ('day',)
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('source', 'last_id', 'updated_at')
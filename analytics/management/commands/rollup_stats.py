@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollup import SOURCES, rebuild, rollup_source
+
+
+class Command(BaseCommand):
+    help = "Fold enrollments, feedback and chat messages added since the last run into the daily course stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Source ids per transaction.")
+        parser.add_argument("--rebuild", action="store_true", help="Discard existing rollups and start over.")
+
+    def handle(self, *args, **opts):
+        if opts["rebuild"]:
+            rebuild()
+            self.stdout.write("Cleared rollups and watermarks.")
+        for source in SOURCES:
+            n = rollup_source(source, opts["batch_size"])
+            self.stdout.write(f"{source}: {n} new row(s)")
+        self.stdout.write(self.style.SUCCESS("Rollup complete."))
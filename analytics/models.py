@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import models
+from courses.models import Course
+
+
+class CourseDailyStats(models.Model):
+    """Per-course, per-day counters filled by ``manage.py rollup_stats``."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    new_enrollments = models.PositiveIntegerField(default=0)
+    feedback_posts = models.PositiveIntegerField(default=0)
+    chat_messages = models.PositiveIntegerField(default=0)
+    active_chatters = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["course", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["course", "day"], name="course_daily_stats_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} @ {self.day}"
+
+
+class CourseDailyChatter(models.Model):
+    """Distinct (course, day, user) chat participants; lets active_chatters be rolled up incrementally."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["course", "day", "user"], name="course_daily_chatter_uniq"),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Highest source-table id already folded into the rollups."""
+    source = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} ≤ {self.last_id}"
@@ -0,0 +1,144 @@
+"""Incremental daily rollups of course activity.
+
+Each source table has a watermark: the highest id already counted. A run
+aggregates only rows above it, in id ranges of ``batch_size``, adds the
+per-(course, day) counts onto ``CourseDailyStats`` and advances the watermark
+in the same transaction, so an interrupted run resumes where it stopped and
+never counts a row twice.
+
+Ids are allocated at insert but become visible at commit, so a row can appear
+below a watermark that has already passed it. A run therefore stops at the
+newest row older than ROLLUP_SETTLE_SECONDS: anything with a lower id was
+inserted before that and has committed unless its transaction stayed open for
+the whole window.
+
+Distinct chatters are not additive across batches, so each (course, day,
+user) is recorded once in ``CourseDailyChatter`` and ``active_chatters`` is
+recounted from there for the days a batch touched.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from chat.models import ChatMessage
+from courses.models import Enrollment, Feedback
+from .models import CourseDailyChatter, CourseDailyStats, RollupWatermark
+
+# source name -> (model, timestamp field, CourseDailyStats counter)
+SOURCES = {
+    "enrollment": (Enrollment, "enrolled_at", "new_enrollments"),
+    "feedback": (Feedback, "created_at", "feedback_posts"),
+    "chat": (ChatMessage, "created_at", "chat_messages"),
+}
+
+
+def _ensure_rows(keys):
+    CourseDailyStats.objects.bulk_create(
+        [CourseDailyStats(course_id=course_id, day=day) for course_id, day in keys],
+        ignore_conflicts=True,
+    )
+
+
+# Courses per UPDATE; one OR term per (course, day) overflows SQLite's expression depth.
+KEY_CHUNK_SIZE = 500
+
+
+def _day_filters(keys):
+    """``Q`` objects covering ``keys`` (course_id, day), one day and a bounded id list each."""
+    by_day = defaultdict(list)
+    for course_id, day in keys:
+        by_day[day].append(course_id)
+    for day, course_ids in by_day.items():
+        for i in range(0, len(course_ids), KEY_CHUNK_SIZE):
+            yield Q(day=day, course_id__in=course_ids[i:i + KEY_CHUNK_SIZE])
+
+
+def rollup_settle_seconds() -> int:
+    return getattr(settings, "ROLLUP_SETTLE_SECONDS", 300)
+
+
+def _settled_high(model, ts_field) -> int:
+    # Walks the pk index down from the newest row; only the settle window is skipped over.
+    cutoff = timezone.now() - timedelta(seconds=rollup_settle_seconds())
+    return (
+        model.objects.filter(**{f"{ts_field}__lte": cutoff})
+        .order_by("-id").values_list("id", flat=True).first()
+    ) or 0
+
+
+def _record_chatters(batch):
+    pairs = list(
+        batch.annotate(day=TruncDate("created_at"))
+        .values_list("course_id", "day", "user_id")
+        .distinct()
+    )
+    CourseDailyChatter.objects.bulk_create(
+        [CourseDailyChatter(course_id=c, day=d, user_id=u) for c, d, u in pairs],
+        ignore_conflicts=True,
+    )
+    keys = {(c, d) for c, d, _ in pairs}
+    chatters = (
+        CourseDailyChatter.objects.filter(course_id=OuterRef("course_id"), day=OuterRef("day"))
+        .order_by().values("course", "day").annotate(n=Count("id")).values("n")
+    )
+    for where in _day_filters(keys):
+        CourseDailyStats.objects.filter(where).update(active_chatters=Subquery(chatters))
+
+
+def rollup_source(source: str, batch_size: int = 5000) -> int:
+    """Fold new rows of one source into the daily stats. Returns rows processed."""
+    model, ts_field, counter = SOURCES[source]
+    high = _settled_high(model, ts_field)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            mark, _ = RollupWatermark.objects.select_for_update().get_or_create(source=source)
+            if mark.last_id >= high:
+                break
+            upper = min(mark.last_id + batch_size, high)
+            batch = model.objects.filter(id__gt=mark.last_id, id__lte=upper).order_by()
+            counts = list(
+                batch.annotate(day=TruncDate(ts_field))
+                .values("course_id", "day")
+                .annotate(n=Count("id"))
+                .values_list("course_id", "day", "n")
+            )
+            _ensure_rows((c, d) for c, d, _ in counts)
+            for course_id, day, n in counts:
+                CourseDailyStats.objects.filter(course_id=course_id, day=day).update(**{counter: F(counter) + n})
+            if source == "chat":
+                _record_chatters(batch)
+            processed += sum(n for _, _, n in counts)
+            mark.last_id = upper
+            mark.save(update_fields=["last_id", "updated_at"])
+    return processed
+
+
+def rebuild():
+    """Drop all rollups and watermarks; the next run recomputes from scratch."""
+    with transaction.atomic():
+        CourseDailyStats.objects.all().delete()
+        CourseDailyChatter.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+
+
+STATS_WINDOWS = (7, 30, 90, 365)
+
+
+def stats_window(value, default: int = 30) -> int:
+    """Validate a ``?days=`` parameter against STATS_WINDOWS."""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return default
+    return days if days in STATS_WINDOWS else default
+
+
+def course_stats(course, since: date):
+    """Daily rows for ``course`` from ``since`` onwards, oldest first."""
+    return CourseDailyStats.objects.filter(course=course, day__gte=since).order_by("day")
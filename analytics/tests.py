@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.db.models import Sum
+from django.utils import timezone
+
+from chat.models import ChatMessage
+from courses.models import Course, Enrollment, Feedback
+from .models import CourseDailyStats, RollupWatermark
+
+User = get_user_model()
+
+
+@override_settings(ROLLUP_SETTLE_SECONDS=0)
+class RollupStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("t1", "t@example.com", "x", role=User.TEACHER)
+        self.s1 = User.objects.create_user("s1", "s1@example.com", "x", role=User.STUDENT)
+        self.s2 = User.objects.create_user("s2", "s2@example.com", "x", role=User.STUDENT)
+        self.course = Course.objects.create(title="Stats", description="d", instructor=self.teacher)
+
+    def rollup(self, batch_size=2):
+        call_command("rollup_stats", batch_size=batch_size, stdout=StringIO())
+
+    def today(self):
+        return CourseDailyStats.objects.get(course=self.course, day=timezone.localdate())
+
+    def test_incremental_runs_only_count_new_rows(self):
+        Enrollment.objects.create(course=self.course, student=self.s1)
+        Feedback.objects.create(course=self.course, student=self.s1, content="a")
+        for _ in range(3):
+            ChatMessage.objects.create(course=self.course, user=self.s1, content="hi")
+        self.rollup()
+        row = self.today()
+        self.assertEqual((row.new_enrollments, row.feedback_posts, row.chat_messages, row.active_chatters), (1, 1, 3, 1))
+
+        self.rollup()
+        self.assertEqual(self.today().chat_messages, 3)
+
+        Enrollment.objects.create(course=self.course, student=self.s2)
+        ChatMessage.objects.create(course=self.course, user=self.s2, content="hey")
+        ChatMessage.objects.create(course=self.course, user=self.s1, content="again")
+        self.rollup()
+        row = self.today()
+        self.assertEqual((row.new_enrollments, row.chat_messages, row.active_chatters), (2, 5, 2))
+        self.assertEqual(
+            RollupWatermark.objects.get(source="chat").last_id, ChatMessage.objects.latest("id").id
+        )
+
+    def test_rows_are_bucketed_by_day(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        ChatMessage.objects.create(course=self.course, user=self.s1, content="old", created_at=yesterday)
+        ChatMessage.objects.create(course=self.course, user=self.s1, content="new")
+        self.rollup()
+        days = list(CourseDailyStats.objects.filter(course=self.course).values_list("day", "chat_messages"))
+        self.assertEqual(days, [(timezone.localdate(yesterday), 1), (timezone.localdate(), 1)])
+
+    def test_recent_rows_wait_for_the_settle_window(self):
+        old = ChatMessage.objects.create(
+            course=self.course, user=self.s1, content="old", created_at=timezone.now() - timedelta(minutes=10)
+        )
+        ChatMessage.objects.create(course=self.course, user=self.s1, content="new")
+        with self.settings(ROLLUP_SETTLE_SECONDS=300):
+            self.rollup()
+        self.assertEqual(RollupWatermark.objects.get(source="chat").last_id, old.id)
+        self.rollup()
+        self.assertEqual(CourseDailyStats.objects.filter(course=self.course).aggregate(n=Sum("chat_messages"))["n"], 2)
+
+    def test_batch_touching_many_course_days(self):
+        courses = Course.objects.bulk_create([
+            Course(title=f"C{i}", description="d", instructor=self.teacher) for i in range(1200)
+        ])
+        ChatMessage.objects.bulk_create([ChatMessage(course=c, user=self.s1, content="hi") for c in courses])
+        self.rollup(batch_size=5000)
+        stats = CourseDailyStats.objects.filter(course__in=courses)
+        self.assertEqual(stats.count(), 1200)
+        self.assertFalse(stats.exclude(active_chatters=1).exists())
+
+    def test_rebuild_recomputes(self):
+        Feedback.objects.create(course=self.course, student=self.s1, content="a")
+        self.rollup()
+        call_command("rollup_stats", rebuild=True, stdout=StringIO())
+        self.assertEqual(self.today().feedback_posts, 1)
+
+    def test_page_and_api_read_rollups_for_instructor_only(self):
+        CourseDailyStats.objects.create(course=self.course, day=timezone.localdate(), chat_messages=7)
+        self.client.login(username="t1", password="x")
+        r = self.client.get(reverse("course_analytics", args=[self.course.id]), {"days": 7})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context["totals"]["chat_messages"], 7)
+        r = self.client.get(f"/api/courses/{self.course.id}/stats/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()[0]["chat_messages"], 7)
+
+        self.client.login(username="s1", password="x")
+        self.assertEqual(self.client.get(reverse("course_analytics", args=[self.course.id])).status_code, 403)
+        self.assertEqual(self.client.get(f"/api/courses/{self.course.id}/stats/").status_code, 403)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("analytics/<int:course_id>/", views.course_analytics, name="course_analytics"),
+]
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.http import HttpResponseForbidden
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+
+from courses.models import Course
+from .rollup import STATS_WINDOWS, course_stats, stats_window
+
+
+@login_required
+def course_analytics(request, course_id):
+    course = get_object_or_404(Course.objects.select_related("instructor"), pk=course_id)
+    if course.instructor_id != request.user.id:
+        return HttpResponseForbidden()
+    days = stats_window(request.GET.get("days"))
+    rows = course_stats(course, timezone.localdate() - timedelta(days=days - 1))
+    totals = rows.aggregate(
+        new_enrollments=Sum("new_enrollments"),
+        feedback_posts=Sum("feedback_posts"),
+        chat_messages=Sum("chat_messages"),
+    )
+    return render(request, "analytics/course_analytics.html", {
+        "course": course,
+        "rows": rows,
+        "totals": totals,
+        "days": days,
+        "ranges": STATS_WINDOWS,
+    })
@@ -0,0 +1,98 @@
+"""Keyset pagination for the REST API.
+
+Every list endpoint pages with ``elearning.keyset``. Each page is one index
+range scan no matter how deep it is, and a cursor stays valid while rows are
+inserted. A viewset names a total ``cursor_ordering`` that an index covers.
+The ordering must end with a unique column.
+
+Responses are ``{"next": url or null, "results": [...]}``. ``?page_size=``
+is capped at API_MAX_PAGE_SIZE. ``?count=1`` adds ``"count"``; it costs a
+COUNT(*) over the whole filtered table, so it is opt-in.
+"""
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from elearning.keyset import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    ordering = ("-id",)
+
+    def get_page_size(self, request) -> int:
+        size = api_settings.PAGE_SIZE or 50
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(size, getattr(settings, "API_MAX_PAGE_SIZE", 200)))
+
+    def get_ordering(self, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+    def page(self, queryset, request, view):
+        return keyset_page(
+            queryset, self.get_ordering(view), request.query_params.get(self.cursor_query_param),
+            self.get_page_size(request),
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        wants_count = request.query_params.get(self.count_query_param, "").lower() in ("1", "true")
+        self.count = queryset.count() if wants_count else None
+        try:
+            rows, self.next_cursor = self.page(queryset, request, view)
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        body = {"next": self.get_next_link(), "results": data}
+        if self.count is not None:
+            body = {"count": self.count, **body}
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "description": f"Only with ?{self.count_query_param}=1."},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class RankedPagination(KeysetPagination):
+    """Search results ordered by relevance.
+
+    A rank is not a stable key, so these pages go by position. The cursor
+    holds an offset. Depth is capped at API_MAX_RANKED_RESULTS so a deep
+    cursor cannot make the database rank and skip an unbounded number of rows.
+    """
+
+    def page(self, queryset, request, view):
+        cursor = request.query_params.get(self.cursor_query_param)
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise InvalidCursor("Malformed cursor.")
+        cap = getattr(settings, "API_MAX_RANKED_RESULTS", 1000)
+        limit = min(self.get_page_size(request), cap - offset)
+        if limit <= 0:
+            return [], None
+        rows = list(queryset[offset:offset + limit + 1])
+        if len(rows) <= limit or offset + limit >= cap:
+            return rows[:limit], None
+        return rows[:limit], encode_cursor([offset + limit])
@@ -1,21 +1,24 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from courses.models import Course, Enrollment, Material, Feedback
+from analytics.models import CourseDailyStats
+from django.urls import reverse
+from courses.models import Course, Enrollment, Material, MaterialArchiveEntry, Feedback
 
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ["id", "username", "first_name", "last_name", "email", "role", "date_joined"]
+        fields = ["id", "username", "first_name", "last_name", "email", "role", "date_joined",
+                  "avatar_thumb", "avatar_medium"]
 
 class CourseSerializer(serializers.ModelSerializer):
     instructor = UserSerializer(read_only=True)
 
     class Meta:
         model = Course
-        fields = ["id", "title", "description", "instructor", "created_at"]
-        read_only_fields = ["instructor", "created_at"]
+        fields = ["id", "title", "description", "instructor", "created_at", "enrollment_count"]
+        read_only_fields = ["instructor", "created_at", "enrollment_count"]
 
 class EnrollmentSerializer(serializers.ModelSerializer):
     student = UserSerializer(read_only=True)
@@ -25,12 +28,38 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         fields = ["id", "student", "course", "enrolled_at"]
         read_only_fields = ["student", "enrolled_at"]
 
+class BulkEnrollmentSerializer(serializers.Serializer):
+    course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.select_related("instructor"))
+    students = serializers.ListField(child=serializers.CharField(allow_blank=True), required=False)
+    file = serializers.FileField(required=False)
+
 class MaterialSerializer(serializers.ModelSerializer):
     class Meta:
         model = Material
         fields = ["id", "course", "title", "upload", "uploaded_at"]
         read_only_fields = ["uploaded_at"]
 
+    def to_representation(self, instance):
+        # Point at the access-checked download view, never at the storage (or presigned) URL.
+        data = super().to_representation(instance)
+        url = reverse("material_download", args=[instance.course_id, instance.id])
+        request = self.context.get("request")
+        data["upload"] = request.build_absolute_uri(url) if request else url
+        return data
+
+class MaterialArchiveEntrySerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MaterialArchiveEntry
+        fields = ["id", "name", "size", "compressed_size", "url"]
+
+    def get_url(self, obj):
+        material = self.context["material"]
+        url = reverse("material_member", args=[material.course_id, material.id, obj.id])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
 class FeedbackSerializer(serializers.ModelSerializer):
     student = UserSerializer(read_only=True)
 
@@ -38,3 +67,8 @@ class FeedbackSerializer(serializers.ModelSerializer):
         model = Feedback
         fields = ["id", "student", "course", "content", "created_at"]
         read_only_fields = ["student", "created_at"]
+
+class CourseDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CourseDailyStats
+        fields = ["day", "new_enrollments", "feedback_posts", "chat_messages", "active_chatters"]
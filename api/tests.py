@@ -1,12 +1,24 @@
+import io
+import shutil
+import tempfile
+import zipfile
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from django.core.files.uploadedfile import SimpleUploadedFile
+from accounts.models import Block, Notification
+from courses.access import course_access
 from courses.models import Course, Enrollment
+from elearning.keyset import encode_cursor
 
 User = get_user_model()
 
 class ApiSmokeTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.teacher = User.objects.create_user(username="t1", password="pw", role=User.TEACHER, email="t1@example.com")
         self.student = User.objects.create_user(username="s1", password="pw", role=User.STUDENT, email="s1@example.com")
 
@@ -49,3 +61,147 @@ class ApiSmokeTests(APITestCase):
         self.client.logout(); self.client.login(username="t1", password="pw")
         r4 = self.client.post("/api/feedbacks/", {"course": course_id, "content": "Nice"})
         self.assertEqual(r4.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_material_archive_contents(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("slides/week1.pdf", b"%PDF-1.4")
+            zf.writestr("slides/week2.pdf", b"%PDF-1.5 ")
+        course = Course.objects.create(title="C", description="D", instructor=self.teacher)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        with self.settings(MEDIA_ROOT=media_root), self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="t1", password="pw")
+            r = self.client.post("/api/materials/", {
+                "course": course.id, "title": "Pack", "upload": SimpleUploadedFile("pack.zip", buf.getvalue()),
+            }, format="multipart")
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+
+        url = f"/api/materials/{r.data['id']}/contents/"
+        r = self.client.get(url, {"page_size": 1})
+        self.assertEqual((r.data["status"], r.data["member_count"]), ("ready", 2))
+        self.assertEqual([m["name"] for m in r.data["results"]], ["slides/week1.pdf"])
+        self.assertEqual(r.data["results"][0]["size"], 8)
+        r = self.client.get(r.data["next"])
+        self.assertEqual([m["name"] for m in r.data["results"]], ["slides/week2.pdf"])
+        self.assertIsNone(r.data["next"])
+
+        self.client.logout(); self.client.login(username="s1", password="pw")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_materials_are_scoped_and_link_to_the_download_view(self):
+        course = Course.objects.create(title="C", description="D", instructor=self.teacher)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        with self.settings(MEDIA_ROOT=media_root), self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="t1", password="pw")
+            r = self.client.post("/api/materials/", {
+                "course": course.id, "title": "Notes", "upload": SimpleUploadedFile("notes.txt", b"hi"),
+            }, format="multipart")
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        download = "http://testserver" + reverse("material_download", args=[course.id, r.data["id"]])
+        self.assertEqual(r.data["upload"], download)
+
+        self.client.logout(); self.client.login(username="s1", password="pw")
+        self.assertEqual(self.client.get("/api/materials/").data["results"], [])
+        self.assertEqual(self.client.get(f"/api/materials/{r.data['id']}/").status_code, status.HTTP_404_NOT_FOUND)
+
+        Enrollment.objects.create(course=course, student=self.student)
+        results = self.client.get("/api/materials/").data["results"]
+        self.assertEqual([(m["id"], m["upload"]) for m in results], [(r.data["id"], download)])
+
+class BulkEnrollmentTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="t1", password="pw", role=User.TEACHER, email="t1@example.com")
+        self.other = User.objects.create_user(username="t2", password="pw", role=User.TEACHER, email="t2@example.com")
+        self.course = Course.objects.create(title="Cohort", description="D", instructor=self.teacher)
+        self.students = [
+            User.objects.create_user(username=f"s{i}", password="pw", role=User.STUDENT, email=f"s{i}@example.com")
+            for i in range(5)
+        ]
+        Enrollment.objects.create(course=self.course, student=self.students[0])
+        Block.objects.create(teacher=self.teacher, blocked=self.students[1])
+        self.client.login(username="t1", password="pw")
+
+    def test_json_rows_report_and_side_effects(self):
+        self.assertFalse(course_access(self.students[2], self.course).enrolled)
+        rows = ["s0", "s1", "s2", str(self.students[3].id), "s2", "nobody", "t2", "s4", "①"]
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post("/api/enrollments/bulk/", {"course": self.course.id, "students": rows}, format="json")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["status"] for row in r.data["results"]],
+            [
+                "already_enrolled", "blocked", "enrolled", "enrolled", "duplicate", "not_found", "not_a_student",
+                "enrolled", "not_found",
+            ],
+        )
+        self.assertEqual(r.data["summary"]["enrolled"], 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, 4)
+        self.assertTrue(course_access(self.students[2], self.course).enrolled)
+        self.assertEqual(Notification.objects.filter(recipient=self.teacher).count(), 1)
+
+    def test_csv_upload_with_header(self):
+        upload = SimpleUploadedFile("cohort.csv", b"username\ns2\ns3\n", content_type="text/csv")
+        r = self.client.post("/api/enrollments/bulk/", {"course": self.course.id, "file": upload}, format="multipart")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["input"] for row in r.data["results"]], ["s2", "s3"])
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+
+    def test_only_the_instructor_can_bulk_enroll(self):
+        self.client.logout(); self.client.login(username="t2", password="pw")
+        r = self.client.post("/api/enrollments/bulk/", {"course": self.course.id, "students": ["s2"]}, format="json")
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.logout(); self.client.login(username="s2", password="pw")
+        r = self.client.post("/api/enrollments/bulk/", {"course": self.course.id, "students": ["s2"]}, format="json")
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Enrollment.objects.filter(student=self.students[2]).exists())
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="t1", password="pw", role=User.TEACHER, email="t1@example.com")
+        for i in range(5):
+            Course.objects.create(title=f"Course {i}", description="D", instructor=self.teacher)
+        self.client.login(username="t1", password="pw")
+
+    def walk(self, url, **params):
+        titles, pages = [], 0
+        r = self.client.get(url, params).json()
+        while True:
+            titles += [c["title"] for c in r["results"]]
+            pages += 1
+            if not r["next"]:
+                return titles, pages
+            r = self.client.get(r["next"]).json()
+
+    def test_cursor_walks_every_row_once_newest_first(self):
+        titles, pages = self.walk("/api/courses/", page_size=2)
+        self.assertEqual(titles, [f"Course {i}" for i in reversed(range(5))])
+        self.assertEqual(pages, 3)
+
+    def test_count_is_opt_in(self):
+        r = self.client.get("/api/courses/").json()
+        self.assertNotIn("count", r)
+        r = self.client.get("/api/courses/", {"count": 1, "page_size": 2}).json()
+        self.assertEqual((r["count"], len(r["results"])), (5, 2))
+
+    def test_page_size_is_capped_and_cursor_validated(self):
+        with self.settings(API_MAX_PAGE_SIZE=3):
+            self.assertEqual(len(self.client.get("/api/courses/", {"page_size": 1000}).json()["results"]), 3)
+        self.assertEqual(self.client.get("/api/courses/", {"cursor": "garbage"}).status_code, 404)
+        # Well-formed, but the values do not fit the ordering columns.
+        for values in (["x", {}], ["2026-01-01T00:00:00+00:00", "x"], [None, 1]):
+            r = self.client.get("/api/courses/", {"cursor": encode_cursor(values)})
+            self.assertEqual(r.status_code, 404, values)
+
+    def test_every_list_endpoint_is_paginated(self):
+        for url in ["/api/users/", "/api/courses/", "/api/enrollments/", "/api/materials/", "/api/feedbacks/"]:
+            r = self.client.get(url, {"page_size": 1})
+            self.assertEqual(r.status_code, 200, url)
+            self.assertIn("results", r.json(), url)
+            self.assertLessEqual(len(r.json()["results"]), 1, url)
@@ -1,20 +1,33 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.response import Response
 
 from .serializers import (
     UserSerializer, CourseSerializer, EnrollmentSerializer,
-    MaterialSerializer, FeedbackSerializer,
+    MaterialSerializer, FeedbackSerializer, BulkEnrollmentSerializer,
+    CourseDailyStatsSerializer, MaterialArchiveEntrySerializer,
 )
+from .pagination import KeysetPagination, RankedPagination
 from .permissions import IsTeacher, IsInstructorOwnerOrReadOnly
-from courses.models import Course, Enrollment, Material, Feedback
+from analytics.rollup import course_stats, stats_window
+from courses.access import is_enrolled
+from courses.bulk import bulk_enroll, bulk_enroll_max_rows, bulk_summary, read_identifiers_csv
+from courses.catalog import CATALOG_ORDERING
+from courses.models import Course, Enrollment, Material, MaterialArchive, Feedback
+from courses.search import search_courses
 
 User = get_user_model()
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all().order_by("id")
     serializer_class = UserSerializer
+    cursor_ordering = ("id",)
     permission_classes = [permissions.IsAuthenticated]
 
     @action(detail=False, methods=["get"], url_path="me")
@@ -24,6 +37,25 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.select_related("instructor").all()
     serializer_class = CourseSerializer
+    cursor_ordering = CATALOG_ORDERING
+
+    def _search(self):
+        return (self.request.query_params.get("search") or "").strip() if self.action == "list" else ""
+
+    def get_queryset(self):
+        q = self._search()
+        if q:
+            return search_courses(q)
+        return super().get_queryset()
+
+    @property
+    def paginator(self):
+        # Search results keep their relevance order, which a keyset cursor cannot follow.
+        if self._search():
+            if not hasattr(self, "_ranked_paginator"):
+                self._ranked_paginator = RankedPagination()
+            return self._ranked_paginator
+        return super().paginator
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
@@ -36,9 +68,20 @@ class CourseViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Only teachers can create courses.")
         serializer.save(instructor=self.request.user)
 
+    @action(detail=True, methods=["get"], url_path="stats")
+    def stats(self, request, pk=None):
+        """Daily rollups for the last ``?days=`` (7/30/90/365) days; instructor only."""
+        course = self.get_object()
+        if course.instructor_id != request.user.id:
+            raise PermissionDenied("Only the course instructor can view analytics.")
+        days = stats_window(request.query_params.get("days"))
+        rows = course_stats(course, timezone.localdate() - timedelta(days=days - 1))
+        return Response(CourseDailyStatsSerializer(rows, many=True).data)
+
 class EnrollmentViewSet(viewsets.ModelViewSet):
     queryset = Enrollment.objects.select_related("student", "course").all()
     serializer_class = EnrollmentSerializer
+    cursor_ordering = ("-id",)
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
@@ -49,15 +92,44 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         u = self.request.user
         return qs.filter(course__instructor=u) if getattr(u, "role", None) == User.TEACHER else qs.filter(student=u)
 
+    @action(detail=False, methods=["post"], url_path="bulk",
+            permission_classes=[permissions.IsAuthenticated, IsTeacher])
+    def bulk(self, request):
+        """Enroll many students at once.
+
+        JSON: ``{"course": 1, "students": ["alice", 42, ...]}``; or multipart
+        with ``course`` and a CSV ``file`` whose first column holds usernames/ids.
+        """
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course = serializer.validated_data["course"]
+        if course.instructor_id != request.user.id:
+            raise PermissionDenied("Only the course instructor can enroll students.")
+        upload = serializer.validated_data.get("file")
+        students = read_identifiers_csv(upload) if upload else serializer.validated_data.get("students", [])
+        if not students:
+            raise ValidationError({"students": "Provide a non-empty list or a CSV file."})
+        if len(students) > bulk_enroll_max_rows():
+            raise ValidationError({"students": f"At most {bulk_enroll_max_rows()} rows per request."})
+        results = bulk_enroll(course, students, actor=request.user)
+        return Response({"course": course.id, "summary": bulk_summary(results), "results": results})
+
 class MaterialViewSet(viewsets.ModelViewSet):
     queryset = Material.objects.select_related("course__instructor").all()
     serializer_class = MaterialSerializer
+    cursor_ordering = ("-id",)
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [permissions.IsAuthenticated(), IsTeacher(), IsInstructorOwnerOrReadOnly()]
         return [permissions.IsAuthenticated()]
 
+    def get_queryset(self):
+        # Only materials of courses the user teaches or is enrolled in.
+        u = self.request.user
+        enrolled = Enrollment.objects.filter(course_id=OuterRef("course_id"), student_id=u.pk)
+        return super().get_queryset().filter(Q(course__instructor_id=u.pk) | Exists(enrolled))
+
     def perform_create(self, serializer):
         course = serializer.validated_data.get("course")
         if not course or course.instructor_id != self.request.user.id:
@@ -65,9 +137,33 @@ class MaterialViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Only the course instructor can add materials.")
         serializer.save()
 
+    @action(detail=True, methods=["get"], url_path="contents")
+    def contents(self, request, pk=None):
+        """Members of a ZIP material; course instructor and enrolled students only."""
+        material = self.get_object()
+        course = material.course
+        if course.instructor_id != request.user.id and not is_enrolled(request.user, course):
+            raise PermissionDenied("Enroll in the course to see this material.")
+        if not material.is_archive:
+            raise NotFound("This material is not an archive.")
+        archive = MaterialArchive.objects.filter(material=material).first()
+        status = archive.status if archive else MaterialArchive.PENDING
+        header = {"status": status, "member_count": archive.member_count if archive else 0}
+        if status != MaterialArchive.READY:
+            return Response({**header, "next": None, "results": []})
+        paginator = KeysetPagination()
+        paginator.ordering = ("id",)
+        entries = paginator.paginate_queryset(archive.entries.all(), request)
+        page = paginator.get_paginated_response(
+            MaterialArchiveEntrySerializer(entries, many=True, context={"request": request, "material": material}).data
+        )
+        return Response({**header, **page.data})
+
+
 class FeedbackViewSet(viewsets.ModelViewSet):
     queryset = Feedback.objects.select_related("student", "course__instructor").all()
     serializer_class = FeedbackSerializer
+    cursor_ordering = ("-id",)
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -84,8 +180,7 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         if not course:
             from rest_framework.exceptions import ValidationError
             raise ValidationError({"course": "This field is required."})
-        is_enrolled = Enrollment.objects.filter(course=course, student=u).exists()
-        if not is_enrolled:
+        if not is_enrolled(u, course):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Enroll in the course first to post feedback.")
         serializer.save(student=u)
@@ -0,0 +1,128 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    """Write-behind buffer for chat messages.
+
+    Messages from every room are collected in memory and persisted by a
+    background thread with one ``bulk_create`` whenever ``max_batch`` messages
+    are pending or ``max_delay`` seconds have passed, whichever comes first.
+    If the batch insert fails the rows are inserted one by one; a row the
+    database rejects (its course or author was deleted, say) is logged and
+    dropped so it cannot block the rest forever.
+    """
+
+    def __init__(self, max_batch=200, max_delay=0.5):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, message):
+        with self._lock:
+            self._pending.append(message)
+            full = len(self._pending) >= self.max_batch
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Persist everything buffered so far. Safe to call from any thread."""
+        from .models import ChatMessage
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create(batch, batch_size=self.max_batch)
+                return len(batch)
+            except Exception:
+                logger.warning("Chat write-behind batch of %d failed; inserting one by one", len(batch), exc_info=True)
+            return self._insert_each(batch)
+
+    def _insert_each(self, batch) -> int:
+        saved = 0
+        for i, message in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    message.save(force_insert=True)
+            except (IntegrityError, DataError):
+                logger.exception(
+                    "Dropping chat message for course %s from user %s", message.course_id, message.user_id
+                )
+                continue
+            except Exception:
+                # Not this row's fault (database down?): keep it and the rest for the next flush.
+                with self._lock:
+                    self._pending[:0] = batch[i:]
+                raise
+            saved += 1
+        return saved
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopping.set()
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout=5)
+        self.flush()
+
+    def _start(self):
+        # Each thread gets its own stop event, so a later add() can start a new one.
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stopping,), name="chat-write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, stopping):
+        try:
+            while not stopping.is_set():
+                self._wakeup.wait(self.max_delay)
+                self._wakeup.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Chat write-behind flush failed")
+        finally:
+            connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def write_behind_enabled() -> bool:
+    return getattr(settings, "CHAT_WRITE_BEHIND", False)
+
+
+def get_buffer() -> ChatWriteBuffer:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = ChatWriteBuffer(
+                max_batch=getattr(settings, "CHAT_WRITE_BEHIND_BATCH", 200),
+                max_delay=getattr(settings, "CHAT_WRITE_BEHIND_DELAY", 0.5),
+            )
+            atexit.register(_buffer.stop)
+        return _buffer
@@ -1,11 +1,16 @@
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from django.utils.encoding import force_str
-from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from accounts.notify import unread_count
 from courses.models import Course
+from .buffer import get_buffer, write_behind_enabled
+from .history import message_json, messages_since
+from .models import ChatMessage
 from .permissions import can_access_course_chat
 
 User = get_user_model()
@@ -37,14 +42,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         self.room_group_name = f"course_{self.course.id}"
+        # Join before replaying so nothing sent in between is lost; the client
+        # drops the rare message that arrives both ways.
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
+        await self._replay_missed()
 
     async def disconnect(self, close_code):
         try:
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         except Exception:
             pass
+        if write_behind_enabled():
+            await database_sync_to_async(get_buffer().flush)()
 
     async def receive(self, text_data=None, bytes_data=None):
         msg = ""
@@ -62,7 +72,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         user = self.scope.get("user")
 
-        await self._save_message(self.course_id, user.id, msg)
+        message = ChatMessage(course_id=self.course_id, user_id=user.id, content=msg)
+        if write_behind_enabled():
+            get_buffer().add(message)
+        else:
+            await self._save_message(message)
 
         payload = {
             "type": "chat.message",
@@ -72,10 +86,42 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 "username": getattr(user, "username", "unknown"),
                 "is_instructor": (self.course.instructor_id == user.id),
             },
-            "timestamp": timezone.now().isoformat(),
+            "timestamp": message.created_at.isoformat(),
         }
         await self.channel_layer.group_send(self.room_group_name, payload)
 
+    def _resume_point(self):
+        params = parse_qs(force_str(self.scope.get("query_string", b"")))
+        after = (params.get("after") or [""])[0]
+        since = (params.get("since") or [""])[0]
+        if after.isascii() and after.isdecimal():
+            return None, int(after)
+        if since:
+            try:
+                return parse_datetime(since.replace(" ", "+")), None
+            except ValueError:
+                return None, None
+        return None, None
+
+    @database_sync_to_async
+    def _missed_messages(self, since, after_id):
+        if write_behind_enabled():
+            get_buffer().flush()
+        if after_id is not None:
+            last = ChatMessage.objects.filter(pk=after_id, course_id=self.course_id).values("created_at").first()
+            if last is None:
+                return []
+            since = last["created_at"]
+        return [message_json(m, self.course.instructor_id) for m in messages_since(self.course, since, after_id)]
+
+    async def _replay_missed(self):
+        since, after_id = self._resume_point()
+        if since is None and after_id is None:
+            return
+        for item in await self._missed_messages(since, after_id):
+            item["replay"] = True
+            await self.send(text_data=json.dumps(item))
+
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
             "message": event["message"],
@@ -84,9 +130,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def _save_message(self, course_id: int, user_id: int, content: str):
-        from .models import ChatMessage
-        return ChatMessage.objects.create(course_id=course_id, user_id=user_id, content=content)
+    def _save_message(self, message):
+        message.save()
+        return message
 
 
 class NotificationsConsumer(AsyncWebsocketConsumer):
@@ -98,6 +144,8 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
         self.user_group = f"user_{user.id}"
         await self.channel_layer.group_add(self.user_group, self.channel_name)
         await self.accept()
+        count = await database_sync_to_async(unread_count)(user.id)
+        await self.send(text_data=json.dumps({"unread_count": count}))
 
     async def disconnect(self, code):
         if hasattr(self, "user_group"):
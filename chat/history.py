@@ -0,0 +1,53 @@
+from django.conf import settings
+
+from elearning.keyset import keyset_filter, keyset_page
+from .models import ChatMessage
+
+# Newest first; served by the (course, created_at) index.
+HISTORY_ORDERING = ("-created_at", "-id")
+
+
+def history_page_size() -> int:
+    return getattr(settings, "CHAT_HISTORY_PAGE_SIZE", 50)
+
+
+def message_json(message, instructor_id) -> dict:
+    return {
+        "id": message.id,
+        "message": message.content,
+        "user": {
+            "id": message.user_id,
+            "username": message.user.username,
+            "is_instructor": message.user_id == instructor_id,
+        },
+        "timestamp": message.created_at.isoformat(),
+    }
+
+
+def history_page(course, before=None, limit=None):
+    """One page of messages older than the ``before`` cursor.
+
+    Returns ``(messages, next_cursor)`` with messages in chronological order so
+    they can be prepended to the log as-is.
+    """
+    qs = ChatMessage.objects.filter(course=course).select_related("user")
+    rows, next_cursor = keyset_page(qs, HISTORY_ORDERING, before, limit or history_page_size())
+    rows.reverse()
+    return rows, next_cursor
+
+
+def messages_since(course, since, after_id=None, limit=None):
+    """Messages after ``(since, after_id)``, oldest first, capped at ``limit``.
+
+    Used to replay what a reconnecting client missed; it is a forward range
+    scan on the (course, created_at) index. Without ``after_id`` the range
+    starts at ``since`` inclusive: several messages can share a timestamp,
+    and the client drops the ones it already shows.
+    """
+    qs = ChatMessage.objects.filter(course=course).select_related("user")
+    if after_id is not None:
+        qs = qs.filter(keyset_filter(("created_at", "id"), (since, after_id)))
+    else:
+        qs = qs.filter(created_at__gte=since)
+    limit = limit or getattr(settings, "CHAT_REPLAY_LIMIT", 500)
+    return list(qs.order_by("created_at", "id")[:limit])
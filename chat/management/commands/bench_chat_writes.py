@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chat.buffer import ChatWriteBuffer
+from chat.models import ChatMessage
+from courses.models import Course
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare per-message chat inserts with the write-behind buffer (messages/sec)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--batch", type=int, default=200)
+        parser.add_argument("--delay", type=float, default=0.5)
+
+    def handle(self, *args, **opts):
+        n = opts["messages"]
+        user, _ = User.objects.get_or_create(username="__chat_bench__", defaults={"role": User.TEACHER})
+        course = Course.objects.create(title="chat bench", description="", instructor=user)
+        try:
+            direct = asyncio.run(self._direct(course.id, user.id, n))
+            buffered = asyncio.run(self._buffered(course.id, user.id, n, opts["batch"], opts["delay"]))
+        finally:
+            course.delete()
+            user.delete()
+
+        self.stdout.write(f"messages: {n}")
+        self.stdout.write(f"per-message insert: {n / direct:10.1f} msg/s ({direct:.3f}s)")
+        self.stdout.write(f"write-behind:       {n / buffered:10.1f} msg/s ({buffered:.3f}s)")
+        self.stdout.write(f"speedup:            {direct / buffered:10.1f}x")
+
+    async def _direct(self, course_id, user_id, n):
+        save = database_sync_to_async(lambda m: m.save())
+        start = time.perf_counter()
+        for i in range(n):
+            await save(ChatMessage(course_id=course_id, user_id=user_id, content=f"msg {i}"))
+        return time.perf_counter() - start
+
+    async def _buffered(self, course_id, user_id, n, batch, delay):
+        buffer = ChatWriteBuffer(max_batch=batch, max_delay=delay)
+        start = time.perf_counter()
+        for i in range(n):
+            buffer.add(ChatMessage(course_id=course_id, user_id=user_id, content=f"msg {i}"))
+        # Time until every message is durable, matching the direct path.
+        await database_sync_to_async(buffer.stop)()
+        return time.perf_counter() - start
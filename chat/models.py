@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from courses.models import Course
 
 
@@ -11,7 +12,9 @@ class ChatMessage(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="chat_messages"
     )
     content = models.TextField(max_length=2000)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the message object is built so the broadcast timestamp and the
+    # stored row agree even when the insert is deferred by the write buffer.
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["created_at"]
@@ -1,6 +1,5 @@
 from django.contrib.auth import get_user_model
-from accounts.models import Block
-from courses.models import Enrollment
+from courses.access import course_access
 
 User = get_user_model()
 
@@ -14,8 +13,7 @@ def can_access_course_chat(user, course) -> bool:
 
     # Blocked students are denied, even if enrolled.
     if getattr(user, "role", None) == User.STUDENT:
-        if Block.objects.filter(teacher=course.instructor, blocked=user).exists():
-            return False
-        return Enrollment.objects.filter(course=course, student=user).exists()
+        access = course_access(user, course)
+        return access.enrolled and not access.blocked
 
     return False
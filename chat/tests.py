@@ -1,12 +1,23 @@
+import csv
+import io
+from datetime import timedelta
+
 from django.test import TestCase, Client
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from courses.models import Course
+from elearning.keyset import encode_cursor
+from .buffer import ChatWriteBuffer
+from .history import messages_since
+from .models import ChatMessage
 
 User = get_user_model()
 
 class ChatViewTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.teacher = User.objects.create_user("t1", "t@example.com", "x", role=User.TEACHER)
         self.student = User.objects.create_user("s1", "s@example.com", "x", role=User.STUDENT)
@@ -18,3 +29,126 @@ class ChatViewTests(TestCase):
 
         self.assertEqual(r.status_code, 302)
 
+
+
+class ChatWriteBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("t1", "t@example.com", "x", role=User.TEACHER)
+        self.course = Course.objects.create(title="Chat101", description="desc", instructor=self.teacher)
+
+    def test_flush_persists_buffered_messages(self):
+        buf = ChatWriteBuffer(max_batch=50, max_delay=60)
+        self.addCleanup(buf.stop)
+        for i in range(3):
+            buf.add(ChatMessage(course=self.course, user=self.teacher, content=f"m{i}"))
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        self.assertEqual(buf.flush(), 3)
+        self.assertEqual(buf.pending(), 0)
+        self.assertEqual(
+            list(ChatMessage.objects.order_by("created_at").values_list("content", flat=True)),
+            ["m0", "m1", "m2"],
+        )
+
+    def test_rejected_row_is_dropped_not_retried(self):
+        buf = ChatWriteBuffer(max_batch=50, max_delay=60)
+        self.addCleanup(buf.stop)
+        buf.add(ChatMessage(course=self.course, user=self.teacher, content="before"))
+        buf.add(ChatMessage(course=self.course, user=self.teacher, content=None))
+        buf.add(ChatMessage(course=self.course, user=self.teacher, content="after"))
+        with self.assertLogs("chat.buffer", "ERROR"):
+            self.assertEqual(buf.flush(), 2)
+        self.assertEqual(buf.pending(), 0)
+        self.assertEqual(
+            sorted(ChatMessage.objects.values_list("content", flat=True)), ["after", "before"]
+        )
+
+    def test_restarts_after_stop(self):
+        buf = ChatWriteBuffer(max_batch=50, max_delay=60)
+        buf.add(ChatMessage(course=self.course, user=self.teacher, content="one"))
+        first = buf._thread
+        buf.flush()  # the test database is not visible to the writer thread's connection
+        buf.stop()
+        self.assertFalse(first.is_alive())
+        self.addCleanup(buf.stop)
+        buf.add(ChatMessage(course=self.course, user=self.teacher, content="two"))
+        self.assertIsNot(buf._thread, first)
+        self.assertTrue(buf._thread.is_alive())
+        self.assertEqual(buf.flush(), 1)
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.teacher = User.objects.create_user("t1", "t@example.com", "x", role=User.TEACHER)
+        self.course = Course.objects.create(title="Chat101", description="desc", instructor=self.teacher)
+        base = timezone.now() - timedelta(days=1)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(course=self.course, user=self.teacher, content=f"m{i}",
+                        created_at=base + timedelta(seconds=i // 2))  # pairs share a timestamp
+            for i in range(120)
+        ])
+        self.client.login(username="t1", password="x")
+
+    def test_room_renders_newest_page_only(self):
+        r = self.client.get(reverse("chat_room", args=[self.course.id]))
+        self.assertEqual(r.status_code, 200)
+        contents = [m.content for m in r.context["history"]]
+        self.assertEqual(contents, [f"m{i}" for i in range(70, 120)])
+        self.assertIsNotNone(r.context["history_cursor"])
+
+    def test_history_pages_backwards_without_gaps(self):
+        seen = []
+        cursor = ""
+        url = reverse("chat_history", args=[self.course.id])
+        while True:
+            d = self.client.get(url, {"before": cursor, "limit": 25}).json()
+            seen = [m["message"] for m in d["results"]] + seen
+            cursor = d["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"m{i}" for i in range(120)])
+
+    def test_resume_keeps_messages_sharing_the_last_timestamp(self):
+        at = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(course=self.course, user=self.teacher, content=c, created_at=at) for c in ("x", "y")
+        ])
+        first = ChatMessage.objects.get(content="x")
+        # The client only saw "x" and knows its timestamp, not its id.
+        self.assertEqual([m.content for m in messages_since(self.course, at)], ["x", "y"])
+        self.assertEqual([m.content for m in messages_since(self.course, at, first.id)], ["y"])
+
+    def test_history_rejects_bad_cursor(self):
+        r = self.client.get(reverse("chat_history", args=[self.course.id]), {"before": "nope"})
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get(reverse("chat_history", args=[self.course.id]), {"before": encode_cursor(["x", {}])})
+        self.assertEqual(r.status_code, 400)
+
+
+class ChatExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("t1", "t@example.com", "x", role=User.TEACHER)
+        self.student = User.objects.create_user("s1", "s@example.com", "x", role=User.STUDENT)
+        self.course = Course.objects.create(title="Chat101", description="desc", instructor=self.teacher)
+        ChatMessage.objects.create(course=self.course, user=self.student, content='hi, "all"')
+        ChatMessage.objects.create(course=self.course, user=self.teacher, content="welcome")
+
+    async def test_instructor_streams_chat_log(self):
+        await self.async_client.alogin(username="t1", password="x")
+        with self.settings(EXPORT_CHUNK_SIZE=1):
+            r = await self.async_client.get(reverse("chat_export", args=[self.course.id, "csv"]))
+            self.assertEqual(r.status_code, 200)
+            self.assertTrue(r.is_async)
+            body = b"".join([chunk async for chunk in r.streaming_content]).decode()
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ["id", "user_id", "username", "created_at", "content"])
+        self.assertEqual([(row[2], row[4]) for row in rows[1:]], [("s1", 'hi, "all"'), ("t1", "welcome")])
+
+    def test_students_cannot_export(self):
+        self.client.login(username="s1", password="x")
+        r = self.client.get(reverse("chat_export", args=[self.course.id, "jsonl"]))
+        self.assertEqual(r.status_code, 403)
@@ -1,11 +1,18 @@
+from datetime import timedelta
+from urllib.parse import quote
+
 from asgiref.sync import async_to_sync
 from channels.auth import AuthMiddlewareStack
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.contrib.auth.models import AnonymousUser
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
 
+from accounts.models import Notification
+from chat.models import ChatMessage
 from courses.models import Course, Enrollment
 import chat.routing
 
@@ -17,6 +24,7 @@ def ws_path_for_course(course_id: int) -> str:
 
 class ChatAuthTests(TransactionTestCase):
     def setUp(self):
+        cache.clear()
         self.application = AuthMiddlewareStack(URLRouter(chat.routing.websocket_urlpatterns))
 
         self.teacher = User.objects.create_user(username="teach", password="pw", role=User.TEACHER)
@@ -59,3 +67,63 @@ class ChatAuthTests(TransactionTestCase):
         other_teacher = User.objects.create_user(username="t2", password="pw", role=User.TEACHER)
         connected = self._connect_as(other_teacher)
         self.assertFalse(connected, "A different teacher must not access this course chat")
+
+    @override_settings(CHAT_WRITE_BEHIND=True)
+    def test_buffered_message_is_persisted_on_disconnect(self):
+        async def _inner():
+            comm = WebsocketCommunicator(self.application, self.path)
+            comm.scope["user"] = self.student
+            connected, _ = await comm.connect()
+            self.assertTrue(connected)
+            await comm.send_json_to({"message": "hello"})
+            event = await comm.receive_json_from()
+            await comm.disconnect()
+            return event
+        event = async_to_sync(_inner)()
+        self.assertEqual(event["message"], "hello")
+        msg = ChatMessage.objects.get(course=self.course)
+        self.assertEqual(msg.content, "hello")
+        self.assertEqual(msg.created_at.isoformat(), event["timestamp"])
+
+    def test_reconnect_replays_only_missed_messages(self):
+        base = timezone.now() - timedelta(minutes=5)
+        msgs = ChatMessage.objects.bulk_create([
+            ChatMessage(course=self.course, user=self.teacher, content=f"m{i}",
+                        created_at=base + timedelta(seconds=i))
+            for i in range(4)
+        ])
+        since = quote(msgs[1].created_at.isoformat())
+
+        async def _inner(query, count):
+            comm = WebsocketCommunicator(self.application, f"{self.path}?{query}")
+            comm.scope["user"] = self.student
+            connected, _ = await comm.connect()
+            self.assertTrue(connected)
+            got = [await comm.receive_json_from() for _ in range(count)]
+            self.assertTrue(await comm.receive_nothing())
+            await comm.disconnect()
+            return got
+
+        # A timestamp resume is inclusive (the client drops what it has); an id resume is exact.
+        for query, expected in ((f"since={since}", ["m1", "m2", "m3"]), (f"after={msgs[1].id}", ["m2", "m3"])):
+            got = async_to_sync(_inner)(query, len(expected))
+            self.assertEqual([m["message"] for m in got], expected)
+            self.assertTrue(all(m["replay"] for m in got))
+
+
+class NotificationsSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.application = AuthMiddlewareStack(URLRouter(chat.routing.websocket_urlpatterns))
+        self.student = User.objects.create_user(username="stud1", password="pw", role=User.STUDENT)
+        Notification.objects.create(recipient=self.student, verb="welcome")
+
+    def test_connect_pushes_unread_count(self):
+        async def _inner():
+            comm = WebsocketCommunicator(self.application, "/ws/notifications/")
+            comm.scope["user"] = self.student
+            connected, _ = await comm.connect()
+            self.assertTrue(connected)
+            data = await comm.receive_json_from()
+            await comm.disconnect()
+            return data
+        self.assertEqual(async_to_sync(_inner)(), {"unread_count": 1})
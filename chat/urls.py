@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path("chat/<int:course_id>/", views.room, name="chat_room"),
+    path("chat/<int:course_id>/history/", views.history, name="chat_history"),
+    path("chat/<int:course_id>/export.<slug:fmt>", views.export, name="chat_export"),
 ]
@@ -1,23 +1,26 @@
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, render
 from courses.models import Course
-from .permissions import can_access_course_chat
+from elearning.export import EXPORT_FORMATS, streaming_export
+from elearning.keyset import InvalidCursor
+from .buffer import get_buffer, write_behind_enabled
+from .history import history_page, history_page_size, message_json
 from .models import ChatMessage
+from .permissions import can_access_course_chat
 
 
-@login_required
-def room(request, course_id: int):
+def _course_for_chat(request, course_id):
     course = get_object_or_404(Course, pk=course_id)
     if not can_access_course_chat(request.user, course):
-        from django.http import Http404
         raise Http404
+    return course
 
-    history = (
-        ChatMessage.objects
-        .filter(course=course)
-        .select_related("user")
-        .order_by("created_at")[:200]
-    )
+
+@login_required
+def room(request, course_id: int):
+    course = _course_for_chat(request, course_id)
+    history, history_cursor = history_page(course)
 
     return render(
         request,
@@ -25,7 +28,45 @@ def room(request, course_id: int):
         {
             "course": course,
             "history": history,
+            "history_cursor": history_cursor,
             "me_id": request.user.id,                   
             "instructor_id": course.instructor_id,      
         },
     )
+
+
+@login_required
+def history(request, course_id: int):
+    course = _course_for_chat(request, course_id)
+    try:
+        limit = min(max(int(request.GET.get("limit", history_page_size())), 1), 200)
+    except ValueError:
+        limit = history_page_size()
+    try:
+        messages, next_cursor = history_page(course, request.GET.get("before"), limit)
+    except InvalidCursor:
+        return JsonResponse({"error": "invalid cursor"}, status=400)
+    return JsonResponse({
+        "results": [message_json(m, course.instructor_id) for m in messages],
+        "next": next_cursor,
+    })
+
+
+@login_required
+def export(request, course_id: int, fmt: str):
+    """Instructor download of the full chat log as CSV / JSON Lines."""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404
+    course = get_object_or_404(Course, pk=course_id)
+    if course.instructor_id != request.user.id:
+        return HttpResponseForbidden()
+    if write_behind_enabled():
+        get_buffer().flush()
+    return streaming_export(
+        ["id", "user_id", "username", "created_at", "content"],
+        ChatMessage.objects.filter(course=course),
+        ("id", "user_id", "user__username", "created_at", "content"),
+        ("created_at", "id"),
+        fmt,
+        f"course-{course.id}-chat",
+    )
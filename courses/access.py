@@ -0,0 +1,90 @@
+"""Cached (blocked, enrolled) lookups per user and course.
+
+Entries are deleted from the cache when an enrollment or block changes, which
+only reaches the other processes if CACHES is a shared backend (see settings).
+Hit/miss counters live in the same cache so every worker adds to one total;
+``manage.py access_cache_stats`` prints them.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from accounts.models import Block
+from .models import Course, Enrollment
+
+CourseAccess = namedtuple("CourseAccess", ["blocked", "enrolled"])
+
+_STATS_KEYS = {"hits": "course_access_stats:hits", "misses": "course_access_stats:misses"}
+
+
+def _key(user_id, course_id) -> str:
+    return f"course_access:{user_id}:{course_id}"
+
+
+def _count(name):
+    key = _STATS_KEYS[name]
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted between add() and incr()
+        cache.add(key, 1, timeout=None)
+
+
+def course_access(user, course) -> CourseAccess:
+    """Block/enrollment state of ``user`` for ``course``, served from cache when possible."""
+    key = _key(user.pk, course.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        _count("hits")
+        return CourseAccess(*cached)
+
+    _count("misses")
+    access = CourseAccess(
+        blocked=Block.objects.filter(teacher_id=course.instructor_id, blocked_id=user.pk).exists(),
+        enrolled=Enrollment.objects.filter(course_id=course.pk, student_id=user.pk).exists(),
+    )
+    cache.set(key, tuple(access), getattr(settings, "COURSE_ACCESS_CACHE_TIMEOUT", 300))
+    return access
+
+
+def is_blocked(user, course) -> bool:
+    return course_access(user, course).blocked
+
+
+def is_enrolled(user, course) -> bool:
+    return course_access(user, course).enrolled
+
+
+def _invalidate(keys):
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # A concurrent request may have re-cached the old state before our commit.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_course_access(user_id, course_ids):
+    _invalidate([_key(user_id, cid) for cid in course_ids])
+
+
+def invalidate_course_students(course_id, user_ids):
+    _invalidate([_key(uid, course_id) for uid in user_ids])
+
+
+def invalidate_teacher_block(teacher_id, student_id):
+    course_ids = list(Course.objects.filter(instructor_id=teacher_id).values_list("id", flat=True))
+    invalidate_course_access(student_id, course_ids)
+
+
+def access_cache_stats() -> dict:
+    counts = cache.get_many(_STATS_KEYS.values())
+    hits = counts.get(_STATS_KEYS["hits"], 0)
+    misses = counts.get(_STATS_KEYS["misses"], 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": (hits / total) if total else 0.0}
+
+
+def reset_access_cache_stats():
+    cache.delete_many(_STATS_KEYS.values())
@@ -0,0 +1,158 @@
+"""Member index for ZIP materials.
+
+After upload a job reads the archive's central directory, which sits at the
+end of the file, plus the 30-byte local header of each member. For every member
+it stores the name, sizes, compression method, CRC and the offset of the data.
+Listing a bundle is then a query. Fetching one member is one range read of the
+archive: stored members are passed through and deflated ones are inflated
+block by block. Nothing is extracted or held in memory whole, and the CRC is
+checked as the last block goes out.
+"""
+import struct
+import zipfile
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Material, MaterialArchive, MaterialArchiveEntry
+
+# zipfile.structFileHeader: signature, versions, flags, method, time, date, crc, sizes, name/extra lengths
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+SUPPORTED_METHODS = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_max_members() -> int:
+    return getattr(settings, "MATERIAL_ARCHIVE_MAX_MEMBERS", 10000)
+
+
+def _read_members(f):
+    with zipfile.ZipFile(f) as zf:
+        infos = zf.infolist()
+    if len(infos) > archive_max_members():
+        raise ArchiveError(f"More than {archive_max_members()} members.")
+    name_max = MaterialArchiveEntry._meta.get_field("name").max_length
+    for info in infos:
+        # Directories carry no data; encrypted members could not be served anyway.
+        if info.is_dir() or info.flag_bits & 0x1 or len(info.filename) > name_max:
+            continue
+        f.seek(info.header_offset)
+        header = f.read(_LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size:
+            raise ArchiveError("Truncated archive.")
+        fields = _LOCAL_HEADER.unpack(header)
+        if fields[0] != _LOCAL_SIGNATURE:
+            raise ArchiveError(f"Bad local header for {info.filename!r}.")
+        yield MaterialArchiveEntry(
+            name=info.filename,
+            size=info.file_size,
+            compressed_size=info.compress_size,
+            compress_type=info.compress_type,
+            crc=info.CRC,
+            data_offset=info.header_offset + _LOCAL_HEADER.size + fields[10] + fields[11],
+        )
+
+
+def index_archive(material_id):
+    """(Re)build the member index of a ZIP material; drops it if the file is no longer a ZIP."""
+    material = Material.objects.filter(pk=material_id).first()
+    if material is None:
+        return None
+    name = material.upload.name
+    if not material.is_archive:
+        MaterialArchive.objects.filter(material_id=material_id).delete()
+        return None
+
+    entries, status, error = [], MaterialArchive.READY, ""
+    try:
+        with material.upload.open("rb") as f:
+            entries = list(_read_members(f))
+    except (ArchiveError, zipfile.BadZipFile, OSError, ValueError) as exc:
+        entries, status, error = [], MaterialArchive.FAILED, str(exc)[:200]
+
+    with transaction.atomic():
+        # The upload was replaced while we read it; the job queued for the new file wins.
+        if not Material.objects.filter(pk=material_id, upload=name).exists():
+            return None
+        archive, _ = MaterialArchive.objects.select_for_update().get_or_create(
+            material_id=material_id, defaults={"upload_name": name}
+        )
+        archive.entries.all().delete()
+        for entry in entries:
+            entry.archive = archive
+        MaterialArchiveEntry.objects.bulk_create(entries, batch_size=500)
+        archive.upload_name = name
+        archive.status = status
+        archive.error = error
+        archive.member_count = len(entries)
+        archive.total_size = sum(e.size for e in entries)
+        archive.save()
+    return archive
+
+
+def _read_range(storage, name, start, length):
+    if length <= 0:
+        return
+    if hasattr(storage, "bucket_name"):
+        # S3 serves the byte range itself; nothing before or after it is fetched.
+        body = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name, Key=storage._normalize_name(name),
+            Range=f"bytes={start}-{start + length - 1}",
+        )["Body"]
+        yield from body.iter_chunks(READ_BLOCK_SIZE)
+        return
+    with storage.open(name, "rb") as f:
+        f.seek(start)
+        left = length
+        while left:
+            block = f.read(min(READ_BLOCK_SIZE, left))
+            if not block:
+                raise ArchiveError("Archive is shorter than its index.")
+            left -= len(block)
+            yield block
+
+
+def _inflate(raw):
+    d = zlib.decompressobj(-zlib.MAX_WBITS)
+    for block in raw:
+        # Bounded output per call, so a highly compressed block cannot balloon.
+        while block:
+            out = d.decompress(block, READ_BLOCK_SIZE)
+            if out:
+                yield out
+            block = d.unconsumed_tail
+    tail = d.flush()
+    if tail:
+        yield tail
+
+
+def _checked(data, entry):
+    crc, size = 0, 0
+    for block in data:
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+        if size > entry.size:
+            raise ArchiveError("Member is larger than indexed.")
+        yield block
+    if (crc, size) != (entry.crc, entry.size):
+        raise ArchiveError("Member does not match the index.")
+
+
+def member_stream(material, entry):
+    """Iterator over the uncompressed bytes of ``entry``, read straight out of the archive.
+
+    Raises ArchiveError up front for an unsupported compression method, and
+    part-way if the data does not match the index (the response is then cut
+    short rather than completed with bad bytes).
+    """
+    if entry.compress_type not in SUPPORTED_METHODS:
+        raise ArchiveError("Unsupported compression method.")
+    storage = Material._meta.get_field("upload").storage
+    raw = _read_range(storage, material.upload.name, entry.data_offset, entry.compressed_size)
+    return _checked(raw if entry.compress_type == zipfile.ZIP_STORED else _inflate(raw), entry)
@@ -0,0 +1,148 @@
+"""Bulk enrollment of many students into one course.
+
+Rows are usernames or numeric user ids. Users are resolved in batches, the
+instructor's blocks are read in one query and new enrollments are inserted
+with ``bulk_create(ignore_conflicts=True)``. ``bulk_create`` sends no signals,
+so the side effects of ``courses.signals`` (enrollment_count, access cache,
+available-course pages, course page version) are applied here once for the
+whole batch.
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+
+from accounts.models import Block
+from accounts.notify import create_and_push
+from .access import invalidate_course_students
+from .catalog import bump_student_versions
+from .models import Course, Enrollment
+from .pages import bump_course_version
+
+User = get_user_model()
+
+ENROLLED = "enrolled"
+ALREADY_ENROLLED = "already_enrolled"
+NOT_FOUND = "not_found"
+NOT_A_STUDENT = "not_a_student"
+BLOCKED = "blocked"
+DUPLICATE = "duplicate"
+
+CSV_HEADERS = {"username", "id", "user_id", "student"}
+
+
+def bulk_enroll_max_rows() -> int:
+    return getattr(settings, "BULK_ENROLL_MAX_ROWS", 10000)
+
+
+def _resolve(identifiers, batch_size) -> dict:
+    """Map each identifier to ``(user_id, role)``; unknown ones are left out."""
+    found = {}
+    for i in range(0, len(identifiers), batch_size):
+        batch = identifiers[i:i + batch_size]
+        # isdigit() also accepts "²" or "①", which int() rejects; ids are plain ASCII digits.
+        ids = {int(x) for x in batch if x.isascii() and x.isdecimal()}
+        names = {x for x in batch if not (x.isascii() and x.isdecimal())}
+        for uid, username, role in User.objects.filter(
+            Q(id__in=ids) | Q(username__in=names)
+        ).values_list("id", "username", "role"):
+            if uid in ids:
+                found[str(uid)] = (uid, role)
+            if username in names:
+                found[username] = (uid, role)
+    return found
+
+
+def bulk_enroll(course, identifiers, actor=None, batch_size=500):
+    """Enroll the students named by ``identifiers`` into ``course``.
+
+    Returns one ``{"row", "input", "status"[, "user_id"]}`` dict per input row,
+    in input order. Numeric rows are treated as user ids, anything else as a
+    username.
+    """
+    rows = [str(x).strip() for x in identifiers]
+    distinct = list(dict.fromkeys(x for x in rows if x))
+    users = _resolve(distinct, batch_size)
+    blocked = set(Block.objects.filter(teacher_id=course.instructor_id).values_list("blocked_id", flat=True))
+
+    candidates = {uid for uid, role in users.values() if role == User.STUDENT}
+    existing = set()
+    candidate_list = sorted(candidates)
+    for i in range(0, len(candidate_list), batch_size):
+        existing.update(
+            Enrollment.objects.filter(course=course, student_id__in=candidate_list[i:i + batch_size])
+            .values_list("student_id", flat=True)
+        )
+
+    results, seen, new_ids = [], set(), []
+    for n, raw in enumerate(rows, start=1):
+        result = {"row": n, "input": raw}
+        user = users.get(raw)
+        if user is None:
+            result["status"] = NOT_FOUND
+        else:
+            uid, role = user
+            result["user_id"] = uid
+            if uid in seen:
+                result["status"] = DUPLICATE
+            elif role != User.STUDENT:
+                result["status"] = NOT_A_STUDENT
+            elif uid in blocked:
+                result["status"] = BLOCKED
+            elif uid in existing:
+                result["status"] = ALREADY_ENROLLED
+            else:
+                result["status"] = ENROLLED
+                new_ids.append(uid)
+            seen.add(uid)
+        results.append(result)
+
+    with transaction.atomic():
+        Enrollment.objects.bulk_create(
+            [Enrollment(course=course, student_id=uid) for uid in new_ids],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        if new_ids:
+            # Recount rather than add len(new_ids): a concurrent enroll may have won a row.
+            actual = (
+                Enrollment.objects.filter(course=OuterRef("pk"))
+                .order_by().values("course").annotate(n=Count("id")).values("n")
+            )
+            Course.objects.filter(pk=course.pk).update(enrollment_count=Coalesce(Subquery(actual), 0))
+            invalidate_course_students(course.pk, new_ids)
+            bump_student_versions(new_ids)
+            bump_course_version(course.pk)
+
+        summary = bulk_summary(results)
+        create_and_push(
+            recipient=course.instructor,
+            verb=(
+                f"Bulk enrollment into {course.title}: {summary[ENROLLED]} enrolled, "
+                f"{len(results) - summary[ENROLLED]} skipped"
+            )[:140],
+            url=reverse("course_detail", kwargs={"course_id": course.pk}),
+            actor=actor,
+        )
+    return results
+
+
+def read_identifiers_csv(fileobj) -> list:
+    """First column of an uploaded CSV, skipping an optional header row."""
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+    values = [row[0] for row in reader if row and row[0].strip()]
+    if values and values[0].strip().lower() in CSV_HEADERS:
+        values = values[1:]
+    return values
+
+
+def bulk_summary(results) -> dict:
+    summary = dict.fromkeys([ENROLLED, ALREADY_ENROLLED, NOT_FOUND, NOT_A_STUDENT, BLOCKED, DUPLICATE], 0)
+    for r in results:
+        summary[r["status"]] += 1
+    return summary
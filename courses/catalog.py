@@ -0,0 +1,98 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+
+from accounts.models import Block
+from elearning.keyset import keyset_page
+from .models import Course, Enrollment
+
+CATALOG_ORDERING = ("-created_at", "-id")
+AVAILABLE_SORTS = {
+    "newest": ("-created_at", "-id"),
+    "popular": ("-enrollment_count", "-id"),
+}
+_VERSION_KEY = "catalog:version"
+
+
+def catalog_version() -> str:
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(_VERSION_KEY, version, None)
+        version = cache.get(_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    # A fresh token orphans every cached page at once; they expire on their own.
+    cache.set(_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_page_html(cursor=None) -> str:
+    """Rendered HTML for one catalog page, cached per catalog version and cursor."""
+    key = f"catalog:{catalog_version()}:page:{cursor or ''}"
+    html = cache.get(key)
+    if html is None:
+        courses, next_cursor = keyset_page(
+            Course.objects.select_related("instructor"),
+            CATALOG_ORDERING,
+            cursor,
+            getattr(settings, "CATALOG_PAGE_SIZE", 25),
+        )
+        html = render_to_string("courses/_catalog_page.html", {
+            "courses": courses,
+            "next_cursor": next_cursor,
+            "is_first": not cursor,
+        })
+        cache.set(key, html, getattr(settings, "CATALOG_CACHE_TIMEOUT", 300))
+    return html
+
+
+def _student_version_key(user_id) -> str:
+    return f"available:{user_id}:version"
+
+
+def student_version(user_id) -> str:
+    return cache.get(_student_version_key(user_id), "0")
+
+
+def bump_student_version(user_id):
+    cache.set(_student_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def bump_student_versions(user_ids):
+    cache.set_many({_student_version_key(uid): uuid.uuid4().hex for uid in user_ids}, None)
+
+
+def available_courses_qs(student):
+    """Courses the student is not enrolled in and whose instructor has not blocked them.
+
+    Both exclusions are correlated NOT EXISTS subqueries, so the database runs a
+    single anti-join instead of receiving the enrolled ids as a parameter list.
+    """
+    return (
+        Course.objects.select_related("instructor")
+        .filter(~Exists(Enrollment.objects.filter(course=OuterRef("pk"), student=student)))
+        .filter(~Exists(Block.objects.filter(teacher=OuterRef("instructor_id"), blocked=student)))
+    )
+
+
+def available_courses_page(student, sort="newest", cursor=None):
+    """``(courses, next_cursor)`` for one ranked page of a student's available courses.
+
+    Cached per student; the key changes when the catalog or the student's own
+    enrollments or blocks change.
+    """
+    ordering = AVAILABLE_SORTS.get(sort, AVAILABLE_SORTS["newest"])
+    version = student_version(student.pk)
+    key = f"available:{student.pk}:{version}:{catalog_version()}:{sort}:{cursor or ''}"
+    page = cache.get(key)
+    if page is None:
+        page = keyset_page(
+            available_courses_qs(student), ordering, cursor, getattr(settings, "CATALOG_PAGE_SIZE", 25)
+        )
+        cache.set(key, page, getattr(settings, "CATALOG_CACHE_TIMEOUT", 300))
+    return page
@@ -0,0 +1,186 @@
+"""Serving material files through the app.
+
+Access is checked on every request. After that the bytes are never read into
+Python memory as a whole:
+
+* with ``MATERIAL_ACCEL_REDIRECT`` set (recommended in production), the
+  response is an empty ``X-Accel-Redirect`` to an internal front-end location
+  (nginx, or ``X-Sendfile`` style servers via ``MATERIAL_ACCEL_HEADER``),
+  which then handles ranges and sends the file itself;
+* otherwise local files are streamed by the app. The project runs under ASGI,
+  where Django would buffer a synchronous iterator (``FileResponse`` included)
+  in full, so the body is an async iterator reading one block at a time in a
+  worker thread. A single ``Range`` is served as 206 the same way;
+* remote storage (S3) gets a redirect to a presigned URL that expires after
+  ``MATERIAL_URL_EXPIRE`` seconds and names the download. S3 serves ranges
+  and ETags itself.
+
+The ETag is strong. On content-addressed storage it is the file's SHA-256,
+and otherwise a hash of name, size and mtime. Material files are never
+rewritten in place, so either one identifies the exact bytes.
+``If-None-Match`` / ``If-Modified-Since`` answer 304 before the file is
+opened.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import iri_to_uri
+from django.utils.http import content_disposition_header, http_date
+
+from .uploads import material_file_storage
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CAS_RE = re.compile(r"(?:^|/)([0-9a-f]{64})(?:\.[^/]*)?$")
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """``(start, end)`` (inclusive) for a single byte range, or None to send it all.
+
+    Multi-range and malformed headers are ignored, which RFC 9110 allows.
+    Raises RangeNotSatisfiable when the range lies past the end of the file.
+    """
+    m = _RANGE_RE.match(header.replace(" ", "")) if header else None
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _file_blocks(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(READ_BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+async def stream_blocks(blocks):
+    """Async iterator over a blocking iterator of byte blocks.
+
+    Each block is produced in a worker thread, so an ASGI response sends it
+    before the next one is read instead of collecting the whole body first.
+    """
+    done = object()
+    try:
+        while (block := await sync_to_async(next, thread_sensitive=False)(blocks, done)) is not done:
+            yield block
+    finally:
+        close = getattr(blocks, "close", None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=False)()
+
+
+def download_name(material) -> str:
+    """Client-facing filename: the title plus the stored file's extension."""
+    ext = os.path.splitext(material.upload.name)[1].lower()
+    base = (material.title or "material").strip()
+    return base if base.lower().endswith(ext) else base + ext
+
+
+def file_etag(name, size, mtime) -> str:
+    m = _CAS_RE.search(name)
+    if m:
+        return f'"{m.group(1)}"'
+    return '"%s"' % hashlib.sha256(f"{name}:{size}:{mtime}".encode()).hexdigest()[:32]
+
+
+def _accel_response(name, filename, etag, last_modified):
+    prefix = settings.MATERIAL_ACCEL_REDIRECT.rstrip("/")
+    response = HttpResponse()
+    del response["Content-Type"]  # let the front end set it from the file
+    response[getattr(settings, "MATERIAL_ACCEL_HEADER", "X-Accel-Redirect")] = iri_to_uri(f"{prefix}/{name}")
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _remote_redirect(storage, name, filename):
+    url = storage.url(
+        name,
+        parameters={"ResponseContentDisposition": content_disposition_header(True, filename)},
+        expire=getattr(settings, "MATERIAL_URL_EXPIRE", 300),
+    )
+    response = HttpResponseRedirect(url)
+    # The URL is a bearer credential until it expires; keep it out of shared caches.
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def serve_material(request, material):
+    storage = material_file_storage()
+    name = material.upload.name
+    filename = download_name(material)
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return _remote_redirect(storage, name, filename)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    size = stat.st_size
+    etag = file_etag(name, size, stat.st_mtime_ns)
+    last_modified = int(stat.st_mtime)
+    cached = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if cached is not None:
+        cached["Cache-Control"] = "private, no-cache"
+        return cached
+
+    if getattr(settings, "MATERIAL_ACCEL_REDIRECT", ""):
+        response = _accel_response(name, filename, etag, last_modified)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        stream_blocks(_file_blocks(path, start, length)),
+        content_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+    )
+    response["Content-Length"] = str(length)
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    if byte_range is not None:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
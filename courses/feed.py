@@ -0,0 +1,93 @@
+"""Dashboard activity feed of status updates from course peers.
+
+Two users are peers when they share a course, as classmates or as student and
+instructor. A new status is fanned out on write: one ``FeedEntry`` per peer
+(and the author). Courses with more than ``FEED_FANOUT_MAX_AUDIENCE`` students
+get a single course-level entry instead, which members merge in on read.
+
+A page is one keyset range over the reader's inbox index, plus one per large
+course they belong to (usually none), merged and de-duplicated in Python.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from elearning.keyset import cursor_values, encode_cursor, keyset_filter
+from .catalog import student_version
+from .models import Course, Enrollment, FeedEntry
+
+FEED_ORDERING = ("-created_at", "-status_id")
+
+
+def feed_fanout_limit() -> int:
+    return getattr(settings, "FEED_FANOUT_MAX_AUDIENCE", 1000)
+
+
+def feed_page_size() -> int:
+    return getattr(settings, "FEED_PAGE_SIZE", 20)
+
+
+def _member_courses(user_id):
+    return Course.objects.filter(Q(enrollments__student_id=user_id) | Q(instructor_id=user_id)).distinct()
+
+
+def fan_out(status, batch_size=500):
+    """Deliver ``status`` to its author's peers; returns the number of entries written."""
+    author_id = status.user_id
+    recipients = {author_id}
+    small, large = [], []
+    for course_id, instructor_id, size in _member_courses(author_id).values_list(
+        "id", "instructor_id", "enrollment_count"
+    ):
+        if size > feed_fanout_limit():
+            large.append(course_id)
+        else:
+            small.append(course_id)
+            recipients.add(instructor_id)
+    if small:
+        recipients.update(
+            Enrollment.objects.filter(course_id__in=small).values_list("student_id", flat=True).distinct()
+        )
+
+    common = {"status": status, "author_id": author_id, "created_at": status.created_at}
+    entries = [FeedEntry(owner_id=uid, **common) for uid in recipients]
+    entries += [FeedEntry(course_id=cid, **common) for cid in large]
+    FeedEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+    return len(entries)
+
+
+def _large_courses(user) -> list:
+    # Follows the user's enrollments; a course growing past the limit is picked up on expiry.
+    key = f"feed:{user.pk}:{student_version(user.pk)}:large"
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            _member_courses(user.pk).filter(enrollment_count__gt=feed_fanout_limit()).values_list("id", flat=True)
+        )
+        cache.set(key, ids, getattr(settings, "CATALOG_CACHE_TIMEOUT", 300))
+    return ids
+
+
+def feed_page(user, cursor=None, limit=None):
+    """``(entries, next_cursor)`` for one page of ``user``'s feed, newest first.
+
+    Raises InvalidCursor for a malformed cursor.
+    """
+    limit = limit or feed_page_size()
+    after = cursor_values(FeedEntry.objects.all(), FEED_ORDERING, cursor) if cursor else None
+    sources = [Q(owner=user)] + [Q(course_id=cid) for cid in _large_courses(user)]
+
+    merged = {}
+    for where in sources:
+        qs = FeedEntry.objects.filter(where).select_related("status", "author").order_by(*FEED_ORDERING)
+        if after:
+            qs = qs.filter(keyset_filter(FEED_ORDERING, after))
+        for entry in qs[: limit + 1]:
+            merged.setdefault(entry.status_id, entry)
+
+    entries = sorted(merged.values(), key=lambda e: (e.created_at, e.status_id), reverse=True)
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    last = entries[-1]
+    return entries, encode_cursor([last.created_at, last.status_id])
@@ -1,6 +1,8 @@
 import os
 from django import forms
+from django.conf import settings
 from .models import Course, Feedback, Material, StatusUpdate
+from .uploads import MATERIAL_EXTENSIONS
 
 class CourseForm(forms.ModelForm):
     class Meta:
@@ -19,17 +21,16 @@ class MaterialForm(forms.ModelForm):
         if not f:
             return f
 
-        # Allowed extensions & size cap 10 MB
-        allowed_exts = {".pdf", ".doc", ".docx", ".ppt", ".pptx", ".zip"}
-        max_size = 10 * 1024 * 1024 
+        # Single-request uploads are buffered by Django, so they keep a small
+        # cap; larger files go through the chunked upload endpoints.
+        max_size = getattr(settings, "MATERIAL_FORM_MAX_UPLOAD_SIZE", 10 * 1024 * 1024)
 
         ext = os.path.splitext(f.name)[1].lower()
-        if ext not in allowed_exts:
-            raise forms.ValidationError(
-                "Unsupported file type. Allowed: pdf, doc, docx, ppt, pptx, zip."
-            )
+        if ext not in MATERIAL_EXTENSIONS:
+            allowed = ", ".join(sorted(e.lstrip(".") for e in MATERIAL_EXTENSIONS))
+            raise forms.ValidationError(f"Unsupported file type. Allowed: {allowed}.")
         if getattr(f, "size", 0) > max_size:
-            raise forms.ValidationError("File too large (max 10 MB).")
+            raise forms.ValidationError(f"File too large (max {max_size // (1024 * 1024)} MB).")
 
         return f
 
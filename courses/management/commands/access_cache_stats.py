@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from courses.access import access_cache_stats, reset_access_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Print the course access cache hit/miss counters shared by all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **opts):
+        stats = access_cache_stats()
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.1%}")
+        if opts["reset"]:
+            reset_access_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.feed import fan_out
+from courses.models import StatusUpdate
+
+
+class Command(BaseCommand):
+    help = "Fan existing status updates out into activity feeds (safe to re-run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Only statuses from the last N days.")
+
+    def handle(self, *args, **opts):
+        since = timezone.now() - timedelta(days=opts["days"])
+        statuses = StatusUpdate.objects.filter(created_at__gte=since).order_by("id")
+        total = 0
+        for status in statuses.iterator(chunk_size=500):
+            fan_out(status)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Fanned out {total} status update(s)."))
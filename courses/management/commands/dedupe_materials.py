@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from courses.models import Material
+from courses.uploads import material_file_storage
+
+
+class Command(BaseCommand):
+    help = "Move existing material files into content-addressed storage, sharing identical ones (safe to re-run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be saved without changing anything.")
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        storage = material_file_storage()
+        if not getattr(storage, "content_addressed", False):
+            raise CommandError("Material storage is not content-addressed; set MATERIAL_DEDUPE=1 first.")
+
+        prefix = f"{storage.cas_prefix}/"
+        pending = (
+            Material.objects.exclude(Q(upload="") | Q(upload__startswith=prefix))
+            .order_by("upload").values_list("upload", flat=True).distinct()
+        )
+        moved = shared = saved_bytes = 0
+        seen = set()
+        for name in self._names(pending, opts["batch_size"]):
+            if not storage.exists(name):
+                self.stderr.write(f"Missing file, skipped: {name}")
+                continue
+            size = storage.size(name)
+            with storage.open(name, "rb") as f:
+                target = storage.content_name(storage.digest(f), name)
+                existed = target in seen or storage.exists(target)
+                seen.add(target)
+                if not opts["dry_run"] and not existed:
+                    target = storage.save(name, f)
+            moved += 1
+            if existed:
+                shared += 1
+                saved_bytes += size
+            if opts["dry_run"]:
+                continue
+            # A queryset update skips the Material signals, which would release the old name too early.
+            Material.objects.filter(upload=name).update(upload=target)
+            storage.delete(name)
+
+        verb = "Would move" if opts["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved} file(s); {shared} duplicate(s), {saved_bytes} byte(s) saved."
+        ))
+
+    def _names(self, pending, batch_size):
+        # Keyset batches rather than one open cursor: rows are rewritten as we go.
+        last = ""
+        while True:
+            batch = list(pending.filter(upload__gt=last)[:batch_size])
+            if not batch:
+                return
+            yield from batch
+            last = batch[-1]
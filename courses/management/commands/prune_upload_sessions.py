@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import UploadSession
+from courses.uploads import abort_upload
+
+
+class Command(BaseCommand):
+    help = "Abort chunked material uploads that have been idle too long and free their storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=int, default=getattr(settings, "MATERIAL_UPLOAD_SESSION_TTL", 86400))
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(seconds=opts["seconds"])
+        stale = UploadSession.objects.filter(status=UploadSession.ACTIVE, updated_at__lt=cutoff)
+        total = 0
+        for session in stale.iterator(chunk_size=200):
+            abort_upload(session)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Aborted {total} stale upload(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from courses.models import Course, Enrollment
+
+
+class Command(BaseCommand):
+    help = "Recompute Course.enrollment_count wherever it has drifted from the Enrollment table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        actual = (
+            Enrollment.objects.filter(course=OuterRef("pk"))
+            .order_by().values("course").annotate(n=Count("id")).values("n")
+        )
+        drifted = (
+            Course.objects.annotate(actual=Coalesce(Subquery(actual), 0))
+            .exclude(enrollment_count=F("actual"))
+            .only("id", "enrollment_count")
+        )
+        fixed = []
+        for course in drifted.iterator(chunk_size=opts["batch_size"]):
+            course.enrollment_count = course.actual
+            fixed.append(course)
+        for i in range(0, len(fixed), opts["batch_size"]):
+            Course.objects.bulk_update(fixed[i:i + opts["batch_size"]], ["enrollment_count"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(fixed)} course(s)."))
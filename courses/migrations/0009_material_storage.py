@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:00
+
+import courses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='material',
+            name='upload',
+            field=models.FileField(db_index=True, storage=courses.models.material_storage, upload_to='course_materials/'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_material_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialArchive',
+            fields=[
+                ('material', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='courses.material')),
+                ('upload_name', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('member_count', models.PositiveIntegerField(default=0)),
+                ('total_size', models.BigIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MaterialArchiveEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('compressed_size', models.BigIntegerField()),
+                ('compress_type', models.PositiveSmallIntegerField()),
+                ('crc', models.BigIntegerField()),
+                ('data_offset', models.BigIntegerField()),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='courses.materialarchive')),
+            ],
+            options={
+                'ordering': ['name', 'id'],
+                'indexes': [models.Index(fields=['archive', 'name'], name='archive_entry_name_idx')],
+            },
+        ),
+    ]
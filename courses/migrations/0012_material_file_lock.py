@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_upload_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialFileLock',
+            fields=[
+                ('name', models.CharField(max_length=500, primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
+from django.core.files.storage import storages
 
 User = settings.AUTH_USER_MODEL
 
@@ -9,10 +12,31 @@ class Course(models.Model):
     instructor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses_taught')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by signals on Enrollment; `manage.py reconcile_enrollment_counts` repairs drift.
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="course_created_idx"),
+            models.Index(fields=["enrollment_count", "id"], name="course_popular_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, update_fields=None, **kwargs):
+        # The loaded enrollment_count may be stale by now; never write it back
+        # over the signal-maintained value when updating an existing row.
+        if not self._state.adding:
+            if update_fields is None:
+                update_fields = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.name != "enrollment_count"
+                ]
+            else:
+                update_fields = [f for f in update_fields if f != "enrollment_count"]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
 class Enrollment(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
@@ -24,21 +48,53 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student} → {self.course}"
 
+def material_storage():
+    # STORAGES["materials"]: the default storage, or a content-addressed one when MATERIAL_DEDUPE is on.
+    return storages["materials"]
+
 class Material(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='materials')
     title = models.CharField(max_length=200)
-    upload = models.FileField(upload_to='course_materials/')
+    # Indexed so "is this file still referenced?" is a cheap lookup.
+    upload = models.FileField(upload_to='course_materials/', storage=material_storage, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "uploaded_at"], name="material_course_uploaded_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.course})"
 
+    def save(self, *args, **kwargs):
+        # post_save checks the file is still stored; a row it refuses must not be kept.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def is_archive(self) -> bool:
+        return self.upload.name.lower().endswith(".zip")
+
+
+class MaterialFileLock(models.Model):
+    """Row locked while a shared (content-addressed) material file is released or newly referenced."""
+    name = models.CharField(max_length=500, primary_key=True)
+
+    def __str__(self):
+        return self.name
+
 class Feedback(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feedbacks')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='feedbacks')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "created_at"], name="feedback_course_created_idx"),
+        ]
+
     def __str__(self):
         return f"Feedback by {self.student} on {self.course}"
 
@@ -47,5 +103,107 @@ class StatusUpdate(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="status_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user}: {self.content[:30]}…"
+
+class FeedEntry(models.Model):
+    """A status update delivered to one user's inbox (``owner``) or, for very
+    large courses, posted once to the course (``course``) and merged in on read.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='feed_entries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='feed_entries')
+    status = models.ForeignKey(StatusUpdate, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()  # copied from the status so pages read one index
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "created_at", "status"], name="feed_owner_idx"),
+            models.Index(fields=["course", "created_at", "status"], name="feed_course_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "status"], name="feed_owner_status_uniq"),
+            models.UniqueConstraint(fields=["course", "status"], name="feed_course_status_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.status_id} → {self.owner_id or f'course {self.course_id}'}"
+
+
+class UploadSession(models.Model):
+    """Server-side state of a chunked, resumable material upload."""
+    ACTIVE = 'active'
+    COMPLETE = 'complete'
+    ABORTED = 'aborted'
+    STATUS_CHOICES = [(ACTIVE, 'Active'), (COMPLETE, 'Complete'), (ABORTED, 'Aborted')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='upload_sessions')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=200)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()                  # declared total, bytes
+    chunk_size = models.PositiveIntegerField()       # every chunk but the last is exactly this long
+    received = models.BigIntegerField(default=0)     # contiguous bytes stored so far
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ACTIVE)
+    storage_name = models.CharField(max_length=500)  # final name in default storage
+    s3_upload_id = models.CharField(max_length=255, blank=True)
+    parts = models.JSONField(default=list, blank=True)  # S3 [{"PartNumber", "ETag"}]
+    # Set while one request writes the chunk at ``received``; expires after MATERIAL_UPLOAD_CLAIM_TIMEOUT.
+    claim = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    material = models.ForeignKey(Material, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class MaterialArchive(models.Model):
+    """Index state of a ZIP material; its members are ``MaterialArchiveEntry`` rows."""
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (READY, 'Ready'), (FAILED, 'Failed')]
+
+    material = models.OneToOneField(Material, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    upload_name = models.CharField(max_length=500)   # the file that was indexed
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    member_count = models.PositiveIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)   # uncompressed
+    error = models.CharField(max_length=200, blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.upload_name} ({self.status}, {self.member_count} members)"
+
+
+class MaterialArchiveEntry(models.Model):
+    """One file inside a ZIP material, with enough to read it back in one range read."""
+    archive = models.ForeignKey(MaterialArchive, on_delete=models.CASCADE, related_name='entries')
+    name = models.CharField(max_length=1024)
+    size = models.BigIntegerField()              # uncompressed
+    compressed_size = models.BigIntegerField()
+    compress_type = models.PositiveSmallIntegerField()
+    crc = models.BigIntegerField()
+    data_offset = models.BigIntegerField()       # first byte of the member's data in the archive
+
+    class Meta:
+        ordering = ["name", "id"]
+        indexes = [
+            models.Index(fields=["archive", "name"], name="archive_entry_name_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
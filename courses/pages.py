@@ -0,0 +1,113 @@
+"""Versioned cache for the shared parts of the course detail page.
+
+Each course has a version token in the cache; signals on Course, Material,
+Feedback and Enrollment replace it, which orphans every fragment keyed by the
+old token. Materials and feedback are rendered one keyset page at a time so
+the page does not grow with the course's history. Per-viewer state
+(enrollment, instructor controls) is not cached here.
+
+The tokens only work if every process sees the same cache, so CACHES must be
+a shared backend (Redis in production, see settings).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from elearning.keyset import keyset_page
+from .models import Course, Enrollment, Feedback, Material
+
+
+def _version_key(course_id) -> str:
+    return f"course_page:{course_id}:version"
+
+
+def course_version(course_id) -> str:
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_course_version(course_id):
+    key = _version_key(course_id)
+    cache.set(key, uuid.uuid4().hex, None)
+    # A concurrent request may have cached the old state under the new token before our commit.
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def _timeout():
+    return getattr(settings, "COURSE_PAGE_CACHE_TIMEOUT", 300)
+
+
+def course_page(course_id):
+    """Course (with instructor), cached under its version. Raises Http404 if missing."""
+    key = f"course_page:{course_id}:{course_version(course_id)}"
+    course = cache.get(key)
+    if course is None:
+        course = Course.objects.select_related("instructor").filter(pk=course_id).first()
+        if course is None:
+            raise Http404
+        cache.set(key, course, _timeout())
+    return course
+
+
+# Lazily loaded lists on the detail page, newest first.
+DETAIL_LISTS = {
+    "materials": {
+        "queryset": lambda course_id: Material.objects.filter(course_id=course_id),
+        "ordering": ("-uploaded_at", "-id"),
+        "template": "courses/_detail_materials.html",
+        "url_name": "course_materials_page",
+    },
+    "feedback": {
+        "queryset": lambda course_id: Feedback.objects.filter(course_id=course_id).select_related("student"),
+        "ordering": ("-created_at", "-id"),
+        "template": "courses/_detail_feedback.html",
+        "url_name": "course_feedback_page",
+    },
+}
+
+
+def detail_list_html(course_id, kind, cursor=None) -> str:
+    """One keyset page of a detail list as ``<li>`` items plus a "Load more" link.
+
+    Raises InvalidCursor for a bad cursor.
+    """
+    spec = DETAIL_LISTS[kind]
+    key = f"course_page:{course_id}:{course_version(course_id)}:{kind}:{cursor or ''}"
+    html = cache.get(key)
+    if html is None:
+        rows, next_cursor = keyset_page(
+            spec["queryset"](course_id),
+            spec["ordering"],
+            cursor,
+            getattr(settings, "COURSE_DETAIL_PAGE_SIZE", 20),
+        )
+        html = render_to_string(spec["template"], {
+            "rows": rows,
+            "is_first": not cursor,
+            "more_url": (
+                f"{reverse(spec['url_name'], args=[course_id])}?cursor={next_cursor}" if next_cursor else ""
+            ),
+        })
+        cache.set(key, html, _timeout())
+    return html
+
+
+def course_roster_html(course) -> str:
+    """Instructor roster table, cached under the same course version."""
+    key = f"course_page:{course.pk}:{course_version(course.pk)}:roster"
+    html = cache.get(key)
+    if html is None:
+        roster = Enrollment.objects.filter(course=course).select_related("student").order_by("student__username")
+        html = render_to_string("courses/_detail_roster.html", {"course": course, "roster": roster})
+        cache.set(key, html, _timeout())
+    return html
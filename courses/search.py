@@ -0,0 +1,75 @@
+"""Course search backed by an SQLite FTS5 index.
+
+``courses_course_fts`` mirrors Course.title/description with rowid = course id.
+It is created by migration 0005 and kept in sync by the Course signals in
+``courses.signals``. On other databases search falls back to ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course
+
+FTS_TABLE = "courses_course_fts"
+# bm25 column weights: a title hit counts ten times a description hit.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_enabled() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into a safe FTS5 query: every word must match, the last as a prefix."""
+    tokens = _TOKEN.findall(text or "")
+    if not tokens:
+        return ""
+    parts = [f'"{t}"' for t in tokens]
+    parts[-1] += "*"
+    return " ".join(parts)
+
+
+def search_courses(text: str):
+    """Courses matching ``text``, best BM25 rank first, as a lazy queryset."""
+    qs = Course.objects.select_related("instructor")
+    if not fts_enabled():
+        tokens = _TOKEN.findall(text or "")
+        if not tokens:
+            return qs.none()
+        cond = Q()
+        for t in tokens:
+            cond &= Q(title__icontains=t) | Q(description__icontains=t)
+        return qs.filter(cond).order_by("-created_at", "-id")
+
+    match = fts_query(text)
+    if not match:
+        return qs.none()
+    return qs.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = courses_course.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+        select={"rank": f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})"},
+        order_by=["rank", "-id"],
+    )
+
+
+def index_course(course):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course.pk])
+        cur.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (%s, %s, %s)",
+            [course.pk, course.title, course.description],
+        )
+
+
+def unindex_course(course_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course_id])
@@ -0,0 +1,97 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import Block
+from jobs.queue import enqueue
+from .access import invalidate_course_access, invalidate_teacher_block
+from .catalog import bump_catalog_version, bump_student_version
+from .models import Course, Enrollment, Feedback, Material, MaterialArchive, StatusUpdate
+from .pages import bump_course_version
+from .search import index_course, unindex_course
+from .tasks import fan_out_status, index_material_archive
+from .uploads import claim_material_file, release_material_file
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    invalidate_course_access(instance.student_id, [instance.course_id])
+    bump_student_version(instance.student_id)
+    bump_course_version(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Block)
+def block_changed(sender, instance, **kwargs):
+    invalidate_teacher_block(instance.teacher_id, instance.blocked_id)
+    bump_student_version(instance.blocked_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_added(sender, instance, created, **kwargs):
+    if created:
+        Course.objects.filter(pk=instance.course_id).update(enrollment_count=F("enrollment_count") + 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_removed(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id, enrollment_count__gt=0).update(
+        enrollment_count=F("enrollment_count") - 1
+    )
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    index_course(instance)
+    bump_catalog_version()
+    bump_course_version(instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    unindex_course(instance.pk)
+    bump_catalog_version()
+    bump_course_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Material)
+@receiver([post_save, post_delete], sender=Feedback)
+def course_content_changed(sender, instance, **kwargs):
+    bump_course_version(instance.course_id)
+
+
+@receiver(post_save, sender=StatusUpdate)
+def status_posted(sender, instance, created, **kwargs):
+    if created:
+        enqueue(fan_out_status, instance.pk)
+
+
+@receiver(pre_save, sender=Material)
+def material_file_replacing(sender, instance, **kwargs):
+    # Kept so the file can be written again if a release removes it mid-save.
+    instance._upload_content = None if instance.upload._committed else instance.upload.file
+    instance._replaced_upload = None
+    if instance.pk:
+        old = Material.objects.filter(pk=instance.pk).values_list("upload", flat=True).first()
+        instance._replaced_upload = old if old and old != instance.upload.name else None
+
+
+@receiver(post_save, sender=Material)
+def material_file_replaced(sender, instance, created, **kwargs):
+    if created or instance._replaced_upload:
+        claim_material_file(instance.upload.name, instance._upload_content)
+    release_material_file(instance._replaced_upload)
+
+
+@receiver(post_save, sender=Material)
+def material_archive_changed(sender, instance, created, **kwargs):
+    replaced = getattr(instance, "_replaced_upload", None)
+    if replaced:
+        # The stored offsets describe the old file; stop serving members until re-indexed.
+        MaterialArchive.objects.filter(material=instance).update(status=MaterialArchive.PENDING)
+    if (created and instance.is_archive) or replaced:
+        enqueue(index_material_archive, instance.pk)
+
+
+@receiver(post_delete, sender=Material)
+def material_file_deleted(sender, instance, **kwargs):
+    release_material_file(instance.upload.name)
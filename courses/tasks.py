@@ -0,0 +1,48 @@
+from django.urls import reverse
+
+from accounts.notify import bulk_create_and_push
+from jobs.queue import job
+from .archives import index_archive
+from .feed import fan_out
+from .models import Enrollment, Material, StatusUpdate
+
+
+@job
+def notify_material_uploaded(material_id, actor_id):
+    """Tell every enrolled student about a new material.
+
+    Runs on the job worker, so the websocket pushes need the Redis channel
+    layer (or JOBS_EAGER) to reach the web process; see CHANNEL_LAYERS.
+    """
+    material = Material.objects.select_related("course").filter(pk=material_id).first()
+    if material is None:
+        return
+    course = material.course
+    student_ids = list(
+        Enrollment.objects.filter(course=course)
+        .exclude(student_id=actor_id)
+        .values_list("student_id", flat=True)
+    )
+    if not student_ids:
+        return
+
+    bulk_create_and_push(
+        student_ids,
+        verb=f"New material in {course.title}: {material.title or material.upload or 'File'}",
+        url=reverse("course_detail", kwargs={"course_id": course.id}),
+        actor_id=actor_id,
+    )
+
+
+@job
+def fan_out_status(status_id):
+    """Write a new status update into its audience's feed inboxes."""
+    status = StatusUpdate.objects.filter(pk=status_id).first()
+    if status is not None:
+        fan_out(status)
+
+
+@job
+def index_material_archive(material_id):
+    """Record the member listing of an uploaded ZIP."""
+    index_archive(material_id)
@@ -1,14 +1,39 @@
+import json
 import os
+import re
 import shutil
 import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
+from asgiref.sync import async_to_sync
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
 
 from accounts.models import Block
-from courses.models import Course, Enrollment, Feedback, Material, StatusUpdate
+from courses.access import access_cache_stats, course_access, reset_access_cache_stats
+from courses.archives import ArchiveError
+from courses.models import (
+    Course, Enrollment, FeedEntry, Feedback, Material, MaterialArchive, MaterialArchiveEntry, StatusUpdate,
+    UploadSession,
+)
+from courses.uploads import LocalBackend, MaterialFileMissing
+from elearning.keyset import encode_cursor
+from elearning.storage_backends import ContentAddressedFileSystemStorage, MaterialS3Storage
 
 User = get_user_model()
 
@@ -25,6 +50,7 @@ class CoursesTests(TestCase):
             pass
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.teacher = User.objects.create_user(
             username="teacher1", email="t@example.com", password="pass", role=User.TEACHER
@@ -119,3 +145,887 @@ class CoursesTests(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, "Syllabus")
         self.assertContains(r, "Good!")
+
+
+class CourseAccessCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_access_cache_stats()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.student = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.course = Course.objects.create(title="Chemistry", description="Intro", instructor=self.teacher)
+
+    def test_repeat_lookups_hit_cache(self):
+        course_access(self.student, self.course)
+        with self.assertNumQueries(0):
+            access = course_access(self.student, self.course)
+        self.assertFalse(access.enrolled)
+        stats = access_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_stats_command_reads_the_shared_counters(self):
+        course_access(self.student, self.course)
+        course_access(self.student, self.course)
+        out = StringIO()
+        call_command("access_cache_stats", reset=True, stdout=out)
+        self.assertIn("hits=1 misses=1 hit_rate=50.0%", out.getvalue())
+        self.assertEqual(access_cache_stats()["hits"], 0)
+
+    def test_enrollment_changes_invalidate(self):
+        self.assertFalse(course_access(self.student, self.course).enrolled)
+        e = Enrollment.objects.create(course=self.course, student=self.student)
+        self.assertTrue(course_access(self.student, self.course).enrolled)
+        e.delete()
+        self.assertFalse(course_access(self.student, self.course).enrolled)
+
+    def test_block_changes_invalidate(self):
+        self.assertFalse(course_access(self.student, self.course).blocked)
+        b = Block.objects.create(teacher=self.teacher, blocked=self.student)
+        self.assertTrue(course_access(self.student, self.course).blocked)
+        b.delete()
+        self.assertFalse(course_access(self.student, self.course).blocked)
+
+
+class EnrollmentCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.students = [
+            User.objects.create_user(f"s{i}", f"s{i}@example.com", "pass", role=User.STUDENT) for i in range(3)
+        ]
+        self.course = Course.objects.create(title="Chemistry", description="Intro", instructor=self.teacher)
+
+    def count(self):
+        self.course.refresh_from_db(fields=["enrollment_count"])
+        return self.course.enrollment_count
+
+    def test_count_follows_enroll_and_unenroll(self):
+        for s in self.students:
+            self.client.login(username=s.username, password="pass")
+            self.client.get(reverse("enroll", args=[self.course.id]))
+        self.client.get(reverse("enroll", args=[self.course.id]))  # idempotent
+        self.assertEqual(self.count(), 3)
+
+        self.client.login(username="teacher1", password="pass")
+        self.client.get(reverse("unenroll_student", args=[self.course.id, self.students[0].id]))
+        self.assertEqual(self.count(), 2)
+
+    def test_count_follows_api_delete(self):
+        e = Enrollment.objects.create(course=self.course, student=self.students[0])
+        self.client.login(username="s0", password="pass")
+        r = self.client.delete(f"/api/enrollments/{e.id}/")
+        self.assertEqual(r.status_code, 204)
+        self.assertEqual(self.count(), 0)
+
+    def test_saving_a_stale_course_keeps_the_count(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(course=self.course, student=self.students[0])
+        stale.title = "Organic Chemistry"
+        stale.save()
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, "Organic Chemistry")
+
+    def test_reconcile_repairs_drift(self):
+        Enrollment.objects.bulk_create([Enrollment(course=self.course, student=s) for s in self.students])
+        self.assertEqual(self.count(), 0)  # bulk_create skips signals
+        call_command("reconcile_enrollment_counts", stdout=StringIO())
+        self.assertEqual(self.count(), 3)
+
+    def test_teacher_dashboard_query_count_is_fixed(self):
+        self.client.login(username="teacher1", password="pass")
+        self.client.get(reverse("home"))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("home"))
+        few = len(ctx)
+        for i in range(10):
+            c = Course.objects.create(title=f"C{i}", description="x", instructor=self.teacher)
+            Enrollment.objects.create(course=c, student=self.students[0])
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(reverse("home"))
+        self.assertEqual(len(ctx), few)
+        self.assertGreater(few, 0)
+        self.assertContains(r, "1 students")
+
+
+@override_settings(CATALOG_PAGE_SIZE=5)
+class CourseCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        for i in range(12):
+            Course.objects.create(title=f"Course {i:02d}", description="x", instructor=self.teacher)
+        self.client.login(username="teacher1", password="pass")
+
+    def titles(self, response):
+        return re.findall(r"Course \d\d", response.content.decode())
+
+    def test_pages_walk_the_catalog_newest_first(self):
+        seen = []
+        url = reverse("course_list")
+        while url:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            seen += self.titles(r)
+            m = re.search(r'href="([^"]*\?cursor=[^"]+)"', r.content.decode())
+            url = m.group(1).replace("&amp;", "&") if m else None
+        self.assertEqual(seen, [f"Course {i:02d}" for i in reversed(range(12))])
+
+    def test_rendered_pages_are_cached_and_invalidated(self):
+        self.client.get(reverse("course_list"))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("course_list"))
+        self.assertFalse([q for q in ctx.captured_queries if "courses_course" in q["sql"]])
+
+        self.client.post(reverse("course_create"), {"title": "Course 99", "description": "new"})
+        self.assertEqual(self.titles(self.client.get(reverse("course_list")))[0], "Course 99")
+
+        c = Course.objects.get(title="Course 99")
+        c.title = "Course 98"
+        c.save()
+        self.assertEqual(self.titles(self.client.get(reverse("course_list")))[0], "Course 98")
+
+    def test_bad_cursor_is_404(self):
+        r = self.client.get(reverse("course_list"), {"cursor": "garbage"})
+        self.assertEqual(r.status_code, 404)
+        r = self.client.get(reverse("course_list"), {"cursor": encode_cursor(["x", {}])})
+        self.assertEqual(r.status_code, 404)
+
+
+@override_settings(CATALOG_PAGE_SIZE=3)
+class AvailableCoursesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.other = User.objects.create_user("teacher2", "t2@example.com", "pass", role=User.TEACHER)
+        self.student = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.courses = [
+            Course.objects.create(title=f"Course {i:02d}", description="x", instructor=self.teacher) for i in range(5)
+        ]
+        self.blocked_course = Course.objects.create(title="Course 99", description="x", instructor=self.other)
+        Block.objects.create(teacher=self.other, blocked=self.student)
+        Enrollment.objects.create(course=self.courses[0], student=self.student)
+        self.client.login(username="student1", password="pass")
+
+    def available(self, **params):
+        r = self.client.get(reverse("home"), params)
+        self.assertEqual(r.status_code, 200)
+        return [c.title for c in r.context["available_courses"]], r.context["next_cursor"]
+
+    def test_excludes_enrolled_and_blocked_with_anti_join(self):
+        with CaptureQueriesContext(connection) as ctx:
+            first, cursor = self.available()
+        # The activity feed also looks up the student's courses; pick out the catalog query.
+        sql = [q["sql"] for q in ctx.captured_queries
+               if 'FROM "courses_course"' in q["sql"] and "NOT EXISTS" in q["sql"]]
+        self.assertEqual(len(sql), 1)
+        second, end = self.available(cursor=cursor)
+        self.assertEqual(first + second, ["Course 04", "Course 03", "Course 02", "Course 01"])
+        self.assertIsNone(end)
+
+    def test_popular_ranking(self):
+        Course.objects.filter(pk=self.courses[2].pk).update(enrollment_count=50)
+        Course.objects.filter(pk=self.courses[3].pk).update(enrollment_count=10)
+        titles, _ = self.available(sort="popular")
+        self.assertEqual(titles, ["Course 02", "Course 03", "Course 04"])
+
+    def test_cached_per_student_and_invalidated_by_enrollment(self):
+        self.available()
+        with CaptureQueriesContext(connection) as ctx:
+            self.available()
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "courses_course"' in q["sql"]])
+        Enrollment.objects.create(course=self.courses[4], student=self.student)
+        titles, _ = self.available()
+        self.assertNotIn("Course 04", titles)
+
+
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.in_title = Course.objects.create(title="Organic Chemistry", description="Carbon compounds", instructor=self.teacher)
+        self.in_desc = Course.objects.create(title="Lab Skills", description="Safety for chemistry labs", instructor=self.teacher)
+        Course.objects.create(title="Algebra", description="Equations", instructor=self.teacher)
+        self.client.login(username="teacher1", password="pass")
+
+    def search(self, q):
+        r = self.client.get(reverse("course_search"), {"q": q})
+        self.assertEqual(r.status_code, 200)
+        return [c.title for c in r.context["page_obj"]]
+
+    def test_title_hits_rank_above_description_hits(self):
+        self.assertEqual(self.search("chemistry"), ["Organic Chemistry", "Lab Skills"])
+
+    def test_prefix_and_multi_word(self):
+        self.assertEqual(self.search("chem"), ["Organic Chemistry", "Lab Skills"])
+        self.assertEqual(self.search("carbon chem"), ["Organic Chemistry"])
+        self.assertEqual(self.search('"; DROP'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_desc.title = "Geometry"
+        self.in_desc.description = "Shapes"
+        self.in_desc.save()
+        self.assertEqual(self.search("chemistry"), ["Organic Chemistry"])
+        self.assertEqual(self.search("geometry"), ["Geometry"])
+        self.in_title.delete()
+        self.assertEqual(self.search("chemistry"), [])
+
+    def test_api_search_filter(self):
+        r = self.client.get("/api/courses/", {"search": "chemistry"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([c["title"] for c in r.json()["results"]], ["Organic Chemistry", "Lab Skills"])
+
+        # Pages keep relevance order.
+        r = self.client.get("/api/courses/", {"search": "chemistry", "page_size": 1}).json()
+        self.assertEqual([c["title"] for c in r["results"]], ["Organic Chemistry"])
+        r = self.client.get(r["next"]).json()
+        self.assertEqual([c["title"] for c in r["results"]], ["Lab Skills"])
+        self.assertIsNone(r["next"])
+
+
+class CourseDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.student = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.course = Course.objects.create(title="Physics", description="Motion", instructor=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        Feedback.objects.create(course=self.course, student=self.student, content="Great start")
+        self.url = reverse("course_detail", args=[self.course.id])
+
+    def detail_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        return r, [q["sql"] for q in ctx.captured_queries]
+
+    def test_shared_fragments_served_from_cache(self):
+        self.client.login(username="student1", password="pass")
+        self.detail_queries()
+        r, sql = self.detail_queries()
+        self.assertContains(r, "Great start")
+        self.assertContains(r, "Leave Feedback")
+        self.assertFalse([q for q in sql if "courses_" in q])
+
+    @override_settings(COURSE_DETAIL_PAGE_SIZE=2)
+    def test_feedback_is_lazily_paginated_newest_first(self):
+        for i in range(4):
+            Feedback.objects.create(course=self.course, student=self.student, content=f"Post {i}")
+        self.client.login(username="student1", password="pass")
+        r, _ = self.detail_queries()
+        html = r.content.decode()
+        self.assertIn("Post 3", html)
+        self.assertIn("Post 2", html)
+        self.assertNotIn("Post 1", html)
+        more = re.search(r'href="([^"]*/feedback/page/\?cursor=[^"]+)"', html).group(1)
+        r = self.client.get(more.replace("&amp;", "&"))
+        self.assertEqual(r.status_code, 200)
+        page = r.content.decode()
+        self.assertLess(page.index("Post 1"), page.index("Post 0"))
+        self.assertIn("Load more", page)
+        r = self.client.get(reverse("course_feedback_page", args=[self.course.id]), {"cursor": "bogus!"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_feedback_page_uses_course_created_index(self):
+        with connection.cursor() as cur:
+            cur.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM courses_feedback WHERE course_id = %s "
+                "ORDER BY created_at DESC, id DESC LIMIT 21", [self.course.id]
+            )
+            plan = " ".join(str(row) for row in cur.fetchall())
+        self.assertIn("feedback_course_created_idx", plan)
+
+    def test_feedback_material_and_course_edits_bump_version(self):
+        self.client.login(username="student1", password="pass")
+        self.detail_queries()
+        Feedback.objects.create(course=self.course, student=self.student, content="Second thoughts")
+        Material.objects.create(course=self.course, title="Slides", upload="course_materials/slides.pdf")
+        self.course.title = "Physics I"
+        self.course.save()
+        r, _ = self.detail_queries()
+        self.assertContains(r, "Second thoughts")
+        self.assertContains(r, "Slides")
+        self.assertContains(r, "Physics I")
+
+    def test_roster_only_for_instructor_and_follows_enrollments(self):
+        self.client.login(username="student1", password="pass")
+        r, _ = self.detail_queries()
+        self.assertNotContains(r, "Enrolled Students")
+        self.client.login(username="teacher1", password="pass")
+        r, _ = self.detail_queries()
+        self.assertContains(r, "Unenroll")
+        Enrollment.objects.filter(course=self.course).delete()
+        r, _ = self.detail_queries()
+        self.assertContains(r, "No students enrolled yet.")
+
+    def test_deleted_course_is_404(self):
+        self.client.login(username="student1", password="pass")
+        self.detail_queries()
+        self.course.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CourseExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.other = User.objects.create_user("teacher2", "t2@example.com", "pass", role=User.TEACHER)
+        self.course = Course.objects.create(title="Physics", description="Motion", instructor=self.teacher)
+        self.students = [
+            User.objects.create_user(f"student{i}", f"s{i}@example.com", "pass", role=User.STUDENT) for i in range(3)
+        ]
+        for s in self.students:
+            Enrollment.objects.create(course=self.course, student=s)
+        Feedback.objects.create(course=self.course, student=self.students[0], content="Line one\nline two")
+
+    async def export(self, kind, fmt):
+        r = await self.async_client.get(reverse("course_export", args=[self.course.id, kind, fmt]))
+        return r, b"".join([chunk async for chunk in r.streaming_content]).decode()
+
+    async def test_roster_csv_streams_in_chunks(self):
+        await self.async_client.alogin(username="teacher1", password="pass")
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            r, body = await self.export("roster", "csv")
+        self.assertTrue(r.streaming)
+        self.assertTrue(r.is_async)
+        self.assertEqual(r["Content-Disposition"], f'attachment; filename="course-{self.course.id}-roster.csv"')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "student_id,username,email,enrolled_at")
+        self.assertEqual([l.split(",")[1] for l in lines[1:]], ["student0", "student1", "student2"])
+
+    async def test_feedback_jsonl(self):
+        await self.async_client.alogin(username="teacher1", password="pass")
+        r, body = await self.export("feedback", "jsonl")
+        rows = [json.loads(l) for l in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["username"], "student0")
+        self.assertEqual(rows[0]["content"], "Line one\nline two")
+
+    def test_only_the_instructor_can_export(self):
+        url = lambda kind, fmt: reverse("course_export", args=[self.course.id, kind, fmt])
+        self.client.login(username="teacher2", password="pass")
+        self.assertEqual(self.client.get(url("roster", "csv")).status_code, 403)
+        self.client.login(username="student0", password="pass")
+        self.assertEqual(self.client.get(url("feedback", "csv")).status_code, 403)
+        self.client.login(username="teacher1", password="pass")
+        self.assertEqual(self.client.get(url("grades", "csv")).status_code, 404)
+        self.assertEqual(self.client.get(url("roster", "xml")).status_code, 404)
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.alice = User.objects.create_user("alice", "a@example.com", "pass", role=User.STUDENT)
+        self.bob = User.objects.create_user("bob", "b@example.com", "pass", role=User.STUDENT)
+        self.carol = User.objects.create_user("carol", "c@example.com", "pass", role=User.STUDENT)
+        self.course = Course.objects.create(title="Physics", description="Motion", instructor=self.teacher)
+        self.other = Course.objects.create(title="Art", description="Paint", instructor=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.alice)
+        Enrollment.objects.create(course=self.course, student=self.bob)
+        Enrollment.objects.create(course=self.other, student=self.carol)
+
+    def post(self, user, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return StatusUpdate.objects.create(user=user, content=content)
+
+    def feed(self, user, **params):
+        self.client.login(username=user.username, password="pass")
+        r = self.client.get(reverse("activity_feed"), params)
+        self.assertEqual(r.status_code, 200)
+        return [e.status.content for e in r.context["feed"]], r.context["next_cursor"]
+
+    def test_fan_out_reaches_classmates_and_instructor_only(self):
+        self.post(self.alice, "hello class")
+        self.assertEqual(self.feed(self.bob)[0], ["hello class"])
+        self.assertEqual(self.feed(self.teacher)[0], ["hello class"])
+        self.assertEqual(self.feed(self.alice)[0], ["hello class"])
+        self.assertEqual(self.feed(self.carol)[0], [])
+
+    @override_settings(FEED_PAGE_SIZE=2)
+    def test_keyset_pages_with_single_range_query(self):
+        for i in range(5):
+            self.post(self.teacher, f"note {i}")
+        self.client.login(username="bob", password="pass")
+        seen, cursor = [], None
+        while True:
+            params = {"cursor": cursor} if cursor else {}
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(reverse("activity_feed"), params)
+            feed_sql = [q["sql"] for q in ctx.captured_queries if 'FROM "courses_feedentry"' in q["sql"]]
+            self.assertEqual(len(feed_sql), 1)
+            self.assertNotIn(" IN (", feed_sql[0])
+            seen += [e.status.content for e in r.context["feed"]]
+            cursor = r.context["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"note {i}" for i in reversed(range(5))])
+
+    @override_settings(FEED_FANOUT_MAX_AUDIENCE=1)
+    def test_large_courses_fan_out_on_read(self):
+        self.post(self.alice, "big room")
+        self.assertFalse(FeedEntry.objects.filter(owner=self.bob).exists())
+        self.assertTrue(FeedEntry.objects.filter(course=self.course, owner__isnull=True).exists())
+        self.assertEqual(self.feed(self.bob)[0], ["big room"])
+        self.assertEqual(self.feed(self.carol)[0], [])
+
+    def test_dashboard_shows_feed(self):
+        self.post(self.bob, "from bob")
+        self.client.login(username="alice", password="pass")
+        self.assertContains(self.client.get(reverse("home")), "from bob")
+
+
+class _FakeS3Client:
+    """The multipart calls S3Backend makes, kept in memory."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = (Key, {})
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentLength):
+        self.uploads[UploadId][1][PartNumber] = Body.read()
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        key, parts = self.uploads.pop(UploadId)
+        assert key == Key
+        self.objects[Key] = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+@override_settings(MEDIA_ROOT=_TEST_MEDIA_ROOT, MATERIAL_UPLOAD_CHUNK_SIZE=4, MATERIAL_MAX_UPLOAD_SIZE=64)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(_TEST_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.other = User.objects.create_user("teacher2", "t2@example.com", "pass", role=User.TEACHER)
+        self.course = Course.objects.create(title="Film", description="Video", instructor=self.teacher)
+        self.client.login(username="teacher1", password="pass")
+
+    def start(self, filename="lecture.mp4", size=10, title="Lecture 1"):
+        return self.client.post(
+            reverse("material_upload_start", args=[self.course.id]),
+            {"filename": filename, "size": size, "title": title},
+        )
+
+    def put(self, url, data, start, total=10):
+        return self.client.put(
+            url, data, content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(data) - 1}/{total}",
+        )
+
+    def test_chunks_are_assembled_into_a_material(self):
+        s = self.start().json()
+        self.assertEqual((s["chunk_size"], s["received"]), (4, 0))
+        payload = b"0123456789"
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(0, 10, 4):
+                r = self.put(s["url"], payload[offset:offset + 4], offset)
+                self.assertEqual(r.status_code, 200)
+        done = r.json()
+        self.assertEqual(done["status"], "complete")
+        material = Material.objects.get(pk=done["material_id"])
+        self.assertEqual(material.title, "Lecture 1")
+        with material.upload.open("rb") as f:
+            self.assertEqual(f.read(), payload)
+
+    def test_resume_from_server_offset(self):
+        s = self.start().json()
+        self.put(s["url"], b"0123", 0)
+        # A chunk that does not start at the resume point is refused with the real offset.
+        r = self.put(s["url"], b"4567", 8)
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r.json()["received"], 4)
+        self.assertEqual(self.client.get(s["url"]).json()["received"], 4)
+        self.assertEqual(self.put(s["url"], b"4567", 4).status_code, 200)
+        self.assertEqual(self.put(s["url"], b"89", 8).json()["status"], "complete")
+
+    def test_chunk_in_flight_holds_the_offset(self):
+        s = self.start().json()
+        UploadSession.objects.filter(pk=s["id"]).update(claim=uuid.uuid4(), claimed_at=timezone.now())
+        r = self.put(s["url"], b"0123", 0)
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r["Retry-After"], "30")
+        # A claim left behind by a dead request expires.
+        UploadSession.objects.filter(pk=s["id"]).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.put(s["url"], b"0123", 0).status_code, 200)
+        session = UploadSession.objects.get(pk=s["id"])
+        self.assertEqual((session.received, session.claim), (4, None))
+
+    def test_lost_claim_does_not_advance_offset(self):
+        s = self.start().json()
+        write = LocalBackend.write
+
+        def slow_write(backend, session, *args):
+            # Another request takes over the chunk while this one is still writing.
+            UploadSession.objects.filter(pk=session.pk).update(claim=uuid.uuid4())
+            return write(backend, session, *args)
+
+        with mock.patch.object(LocalBackend, "write", slow_write):
+            r = self.put(s["url"], b"0123", 0)
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r.json()["received"], 0)
+
+    def test_s3_sessions_get_their_own_keys(self):
+        client = _FakeS3Client()
+        storage = MaterialS3Storage(
+            access_key="AKIDEXAMPLE", secret_key="secret", bucket_name="materials", region_name="eu-north-1",
+        )
+        field = Material._meta.get_field("upload")
+        original = field.storage
+        field.storage = storage
+        self.addCleanup(setattr, field, "storage", original)
+        connection = mock.Mock(meta=mock.Mock(client=client))
+        with mock.patch.object(MaterialS3Storage, "connection", new_callable=mock.PropertyMock, return_value=connection), \
+                mock.patch.object(storage, "exists", lambda name: storage._normalize_name(name) in client.objects), \
+                self.captureOnCommitCallbacks(execute=True):
+            first, second = self.start(filename="slides.pdf").json(), self.start(filename="slides.pdf").json()
+            self.assertEqual(self.put(second["url"], b"second-pdf", 0).json()["status"], "complete")
+            self.assertEqual(self.put(first["url"], b"first-pdf!", 0).json()["status"], "complete")
+
+        names = {s.storage_name for s in UploadSession.objects.all()}
+        self.assertEqual(len(names), 2)
+        for session in UploadSession.objects.all():
+            self.assertTrue(session.storage_name.startswith(f"course_materials/{session.id}/"))
+            self.assertEqual(session.material.upload.name, session.storage_name)
+        self.assertEqual(
+            sorted(client.objects.values()), [b"first-pdf!", b"second-pdf"]
+        )
+
+    def test_chunk_length_and_limits_are_enforced(self):
+        s = self.start().json()
+        self.assertEqual(self.put(s["url"], b"01", 0).status_code, 400)
+        self.assertEqual(self.start(size=65).status_code, 400)
+        self.assertEqual(self.start(filename="evil.exe").status_code, 400)
+
+    def test_abort_and_ownership(self):
+        s = self.start().json()
+        self.put(s["url"], b"0123", 0)
+        self.client.login(username="teacher2", password="pass")
+        self.assertEqual(self.client.get(s["url"]).status_code, 404)
+        self.assertEqual(self.start().status_code, 404)
+        self.client.login(username="teacher1", password="pass")
+        r = self.client.delete(s["url"])
+        self.assertEqual(r.json()["status"], "aborted")
+        partial = os.path.join(_TEST_MEDIA_ROOT, "uploads", "partial", s["id"])
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(self.put(s["url"], b"4567", 4).status_code, 400)
+
+
+@override_settings(MATERIAL_UPLOAD_CHUNK_SIZE=4, MATERIAL_MAX_UPLOAD_SIZE=64)
+class MaterialDedupeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        field = Material._meta.get_field("upload")
+        self.original_storage = field.storage
+        field.storage = ContentAddressedFileSystemStorage(location=self.root)
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.course = Course.objects.create(title="Dedupe", description="D", instructor=self.teacher)
+        self.client.login(username="teacher1", password="pass")
+
+    def tearDown(self):
+        Material._meta.get_field("upload").storage = self.original_storage
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def upload(self, data, name="notes.pdf"):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("material_upload", args=[self.course.id]),
+                {"title": name, "upload": SimpleUploadedFile(name, data, content_type="application/pdf")},
+            )
+        return Material.objects.latest("id")
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.root, name))
+
+    def test_identical_uploads_share_one_file(self):
+        a = self.upload(b"same bytes", "a.pdf")
+        b = self.upload(b"same bytes", "b.pdf")
+        c = self.upload(b"other bytes", "c.pdf")
+        self.assertEqual(a.upload.name, b.upload.name)
+        self.assertTrue(a.upload.name.startswith("cas/"))
+        self.assertTrue(a.upload.name.endswith(".pdf"))
+        self.assertNotEqual(a.upload.name, c.upload.name)
+        with b.upload.open("rb") as f:
+            self.assertEqual(f.read(), b"same bytes")
+
+    def test_file_removed_with_last_reference(self):
+        a = self.upload(b"shared")
+        b = self.upload(b"shared")
+        name = a.upload.name
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertTrue(self.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            b.delete()
+        self.assertFalse(self.exists(name))
+
+    def test_release_racing_a_new_reference_keeps_the_file(self):
+        a = self.upload(b"shared")
+        name = a.upload.name
+        with self.captureOnCommitCallbacks() as releases:
+            a.delete()
+        storage = Material._meta.get_field("upload").storage
+        save = storage._save
+
+        def racing_save(*args):
+            target = save(*args)  # finds the file already stored and writes nothing
+            for release in releases:
+                release()  # sees no row yet and deletes the file
+            return target
+
+        with mock.patch.object(storage, "_save", racing_save):
+            b = self.upload(b"shared")
+        self.assertEqual(b.upload.name, name)
+        with b.upload.open("rb") as f:
+            self.assertEqual(f.read(), b"shared")
+
+        # Without the bytes at hand the row is refused rather than left dangling.
+        with self.captureOnCommitCallbacks() as releases:
+            b.delete()
+        for release in releases:
+            release()
+        with self.assertRaises(MaterialFileMissing):
+            Material.objects.create(course=self.course, title="Stale", upload=name)
+        self.assertFalse(Material.objects.filter(upload=name).exists())
+
+    def test_chunked_upload_is_deduplicated(self):
+        first = self.upload(b"0123456789", "lecture.mp4")
+        s = self.client.post(
+            reverse("material_upload_start", args=[self.course.id]),
+            {"filename": "copy.mp4", "size": 10, "title": "Copy"},
+        ).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(0, 10, 4):
+                chunk = b"0123456789"[offset:offset + 4]
+                r = self.client.put(
+                    s["url"], chunk, content_type="application/octet-stream",
+                    HTTP_CONTENT_RANGE=f"bytes {offset}-{offset + len(chunk) - 1}/10",
+                )
+        material = Material.objects.get(pk=r.json()["material_id"])
+        self.assertEqual(material.upload.name, first.upload.name)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "uploads", "partial", s["id"])))
+
+    def test_backfill_command_moves_existing_files(self):
+        # Files written before dedupe was switched on.
+        plain = FileSystemStorage(location=self.root)
+        for title in ["one", "two"]:
+            name = plain.save(f"course_materials/{title}.pdf", ContentFile(b"legacy"))
+            Material.objects.create(course=self.course, title=title, upload=name)
+        out = StringIO()
+        call_command("dedupe_materials", "--dry-run", stdout=out)
+        self.assertIn("1 duplicate(s), 6 byte(s)", out.getvalue())
+        self.assertTrue(self.exists("course_materials/one.pdf"))
+
+        call_command("dedupe_materials", stdout=StringIO())
+        names = set(Material.objects.values_list("upload", flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().startswith("cas/"))
+        self.assertFalse(self.exists("course_materials/one.pdf"))
+        self.assertFalse(self.exists("course_materials/two.pdf"))
+
+
+@override_settings(MEDIA_ROOT=_TEST_MEDIA_ROOT)
+class MaterialDownloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.student = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.outsider = User.objects.create_user("student2", "s2@example.com", "pass", role=User.STUDENT)
+        self.course = Course.objects.create(title="Video", description="V", instructor=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.material = Material.objects.create(
+            course=self.course, title="Lecture 1",
+            upload=SimpleUploadedFile("lecture.pdf", b"0123456789", content_type="application/pdf"),
+        )
+        self.url = reverse("material_download", args=[self.course.id, self.material.id])
+        self.client.login(username="student1", password="pass")
+
+    def body(self, response):
+        async def read():
+            return b"".join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(read)()
+
+    def test_full_download_with_validators(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.is_async)
+        self.assertEqual(r["Content-Length"], "10")
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertEqual(self.body(r), b"0123456789")
+        self.assertEqual(r["Accept-Ranges"], "bytes")
+        self.assertIn('filename="Lecture 1.pdf"', r["Content-Disposition"])
+        self.assertTrue(r["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", r)
+
+    def test_conditional_requests_return_304(self):
+        r = self.client.get(self.url)
+        etag, modified = r["ETag"], r["Last-Modified"]
+        r.close()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(r.status_code, 200)
+        r.close()
+
+    def test_range_requests(self):
+        r = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(r["Content-Length"], "4")
+        self.assertEqual(self.body(r), b"2345")
+
+        r = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(self.body(r), b"789")
+        r = self.client.get(self.url, HTTP_RANGE="bytes=7-")
+        self.assertEqual(self.body(r), b"789")
+
+        r = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(r.status_code, 416)
+        self.assertEqual(r["Content-Range"], "bytes */10")
+
+        # A stale If-Range gets the whole, current file.
+        r = self.client.get(self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.body(r), b"0123456789")
+
+    @override_settings(MATERIAL_ACCEL_REDIRECT="/protected/")
+    def test_accel_redirect_offload(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["X-Accel-Redirect"], f"/protected/{self.material.upload.name}")
+        self.assertEqual(r.content, b"")
+
+    def test_remote_storage_redirects_to_presigned_url(self):
+        field = Material._meta.get_field("upload")
+        original = field.storage
+        field.storage = MaterialS3Storage(
+            access_key="AKIDEXAMPLE", secret_key="secret", bucket_name="materials", region_name="eu-north-1",
+        )
+        try:
+            with override_settings(MATERIAL_URL_EXPIRE=120):
+                r = self.client.get(self.url)
+        finally:
+            field.storage = original
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(r["Cache-Control"], "private, no-store")
+        query = parse_qs(urlsplit(r["Location"]).query)
+        self.assertEqual(query["X-Amz-Expires"], ["120"])
+        self.assertIn('filename="Lecture 1.pdf"', query["response-content-disposition"][0])
+
+    def test_access_is_checked(self):
+        self.client.login(username="student2", password="pass")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.login(username="teacher1", password="pass")
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        r.close()
+        other = Course.objects.create(title="Other", description="O", instructor=self.teacher)
+        self.assertEqual(
+            self.client.get(reverse("material_download", args=[other.id, self.material.id])).status_code, 404
+        )
+
+    def test_detail_page_links_to_download_view(self):
+        self.assertContains(self.client.get(reverse("course_detail", args=[self.course.id])), self.url)
+
+
+@override_settings(MEDIA_ROOT=_TEST_MEDIA_ROOT)
+class MaterialArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher1", "t@example.com", "pass", role=User.TEACHER)
+        self.student = User.objects.create_user("student1", "s@example.com", "pass", role=User.STUDENT)
+        self.course = Course.objects.create(title="Assets", description="A", instructor=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.client.login(username="student1", password="pass")
+
+    def bundle(self):
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("readme.txt", b"hello", compress_type=zipfile.ZIP_STORED)
+            zf.writestr("data/big.csv", b"a,b,c\n" * 50000, compress_type=zipfile.ZIP_DEFLATED)
+            zf.writestr("data/", b"")
+        return buf.getvalue()
+
+    def add(self, data, name="bundle.zip"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Material.objects.create(
+                course=self.course, title="Bundle", upload=SimpleUploadedFile(name, data),
+            )
+
+    def member(self, material, name):
+        entry = MaterialArchiveEntry.objects.get(archive__material=material, name=name)
+        return self.client.get(reverse("material_member", args=[self.course.id, material.id, entry.id]))
+
+    def body(self, response):
+        async def read():
+            return b"".join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(read)()
+
+    def test_upload_is_indexed(self):
+        material = self.add(self.bundle())
+        archive = MaterialArchive.objects.get(material=material)
+        self.assertEqual(archive.status, MaterialArchive.READY)
+        self.assertEqual(archive.member_count, 2)
+        self.assertEqual(archive.total_size, 5 + 6 * 50000)
+        r = self.client.get(reverse("material_contents", args=[self.course.id, material.id]))
+        self.assertContains(r, "data/big.csv")
+        self.assertNotContains(r, "data/</span>")
+
+    def test_members_stream_out_individually(self):
+        material = self.add(self.bundle())
+        r = self.member(material, "readme.txt")
+        self.assertEqual(r["Content-Length"], "5")
+        self.assertIn('filename="readme.txt"', r["Content-Disposition"])
+        self.assertTrue(r.is_async)
+        self.assertEqual(self.body(r), b"hello")
+
+        r = self.member(material, "data/big.csv")
+        self.assertEqual(r["Content-Type"], "text/csv")
+        self.assertEqual(self.body(r), b"a,b,c\n" * 50000)
+
+    def test_corrupt_member_is_cut_short(self):
+        material = self.add(self.bundle())
+        MaterialArchiveEntry.objects.filter(name="readme.txt").update(crc=0)
+        r = self.member(material, "readme.txt")
+        with self.assertRaises(ArchiveError):
+            self.body(r)
+
+    def test_bad_zip_and_replacement(self):
+        material = self.add(b"not a zip")
+        archive = MaterialArchive.objects.get(material=material)
+        self.assertEqual(archive.status, MaterialArchive.FAILED)
+        self.assertContains(
+            self.client.get(reverse("material_contents", args=[self.course.id, material.id])), "could not be read"
+        )
+        material.upload = SimpleUploadedFile("fixed.zip", self.bundle())
+        with self.captureOnCommitCallbacks(execute=True):
+            material.save()
+        archive.refresh_from_db()
+        self.assertEqual((archive.status, archive.member_count), (MaterialArchive.READY, 2))
+
+        material.upload = SimpleUploadedFile("notes.pdf", b"%PDF-1.4")
+        with self.captureOnCommitCallbacks(execute=True):
+            material.save()
+        self.assertFalse(MaterialArchive.objects.filter(material=material).exists())
+
+    def test_access_is_checked(self):
+        material = self.add(self.bundle())
+        User.objects.create_user("student2", "s2@example.com", "pass", role=User.STUDENT)
+        self.client.login(username="student2", password="pass")
+        self.assertEqual(self.member(material, "readme.txt").status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse("material_contents", args=[self.course.id, material.id])).status_code, 403
+        )
@@ -0,0 +1,329 @@
+"""Chunked, resumable material uploads.
+
+The client opens an ``UploadSession`` with the file's name and size, then
+PUTs fixed-size chunks with a ``Content-Range`` header. Each chunk is copied
+from the request stream straight to storage in small blocks:
+
+* on the local filesystem it is written at its offset in a partial file that
+  is renamed into place when the last chunk lands;
+* on S3 (``MediaRootS3Boto3Storage``) it becomes one part of a multipart
+  upload, spooled to a temp file first since a part needs a known length.
+  These keys are not content-addressed; ``dedupe_materials`` folds them in.
+
+Nothing holds more than one block (or one spooled part) in memory, and the
+finished file is never read back. ``received`` is the resume point: a client
+that lost its connection asks for it and continues from there.
+
+No transaction is open while a chunk body is read or storage is called. A
+short one claims the offset, the bytes are stored, and a second short one
+checks the claim still holds before advancing ``received``.
+"""
+import mimetypes
+import os
+import posixpath
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from .models import Material, MaterialFileLock, UploadSession
+from .tasks import notify_material_uploaded
+
+MATERIAL_EXTENSIONS = {
+    ".pdf", ".doc", ".docx", ".ppt", ".pptx", ".zip",
+    ".mp4", ".webm", ".mov", ".mp3",
+}
+COPY_BLOCK_SIZE = 64 * 1024
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadError(Exception):
+    status = 400
+    retry_after = None  # seconds, sent as Retry-After
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class MaterialFileMissing(UploadError):
+    status = 410
+
+
+def material_max_upload_size() -> int:
+    return getattr(settings, "MATERIAL_MAX_UPLOAD_SIZE", 2 * 1024 ** 3)
+
+
+def upload_chunk_size() -> int:
+    return getattr(settings, "MATERIAL_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+
+
+def upload_claim_timeout() -> int:
+    return getattr(settings, "MATERIAL_UPLOAD_CLAIM_TIMEOUT", 15 * 60)
+
+
+class _PartialFile(File):
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _copy(stream, out, length) -> int:
+    left = length
+    while left:
+        block = stream.read(min(COPY_BLOCK_SIZE, left))
+        if not block:
+            break
+        out.write(block)
+        left -= len(block)
+    return length - left
+
+
+class LocalBackend:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _partial(self, session):
+        return self.storage.path(os.path.join("uploads", "partial", str(session.id)))
+
+    def start(self, session):
+        path = self._partial(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+
+    def write(self, session, offset, stream, length) -> int:
+        with open(self._partial(session), "r+b") as out:
+            out.seek(offset)
+            written = _copy(stream, out, length)
+            # Drop bytes left behind by an earlier attempt at this chunk.
+            out.truncate()
+        return written
+
+    def complete(self, session) -> str:
+        partial = self._partial(session)
+        # Saving a file that reports a temporary path lets the storage move it
+        # into place (or, when content-addressed, find it is already stored).
+        with _PartialFile(open(partial, "rb")) as f:
+            name = self.storage.save(session.storage_name, f)
+        if os.path.exists(partial):
+            os.remove(partial)
+        return name
+
+    def abort(self, session):
+        try:
+            os.remove(self._partial(session))
+        except FileNotFoundError:
+            pass
+
+
+class S3Backend:
+    def __init__(self, storage):
+        self.storage = storage
+        self.client = storage.connection.meta.client
+
+    def _key(self, session):
+        return self.storage._normalize_name(session.storage_name)
+
+    def start(self, session):
+        # The multipart upload writes the key directly, past the storage's
+        # get_available_name / file_overwrite; a per-session prefix keeps it unique.
+        head, tail = posixpath.split(session.storage_name)
+        session.storage_name = self.storage.get_available_name(posixpath.join(head, str(session.id), tail))
+        content_type = mimetypes.guess_type(session.filename)[0] or "application/octet-stream"
+        resp = self.client.create_multipart_upload(
+            Bucket=self.storage.bucket_name, Key=self._key(session), ContentType=content_type,
+        )
+        session.s3_upload_id = resp["UploadId"]
+
+    def write(self, session, offset, stream, length) -> int:
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as part:
+            written = _copy(stream, part, length)
+            if written != length:
+                return written
+            part.seek(0)
+            number = offset // session.chunk_size + 1
+            resp = self.client.upload_part(
+                Bucket=self.storage.bucket_name, Key=self._key(session), UploadId=session.s3_upload_id,
+                PartNumber=number, Body=part, ContentLength=length,
+            )
+        session.parts = [p for p in session.parts if p["PartNumber"] != number]
+        session.parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+        return written
+
+    def complete(self, session) -> str:
+        self.client.complete_multipart_upload(
+            Bucket=self.storage.bucket_name, Key=self._key(session), UploadId=session.s3_upload_id,
+            MultipartUpload={"Parts": sorted(session.parts, key=lambda p: p["PartNumber"])},
+        )
+        return session.storage_name
+
+    def abort(self, session):
+        if session.s3_upload_id:
+            self.client.abort_multipart_upload(
+                Bucket=self.storage.bucket_name, Key=self._key(session), UploadId=session.s3_upload_id,
+            )
+
+
+def material_file_storage():
+    return Material._meta.get_field("upload").storage
+
+
+def get_backend():
+    storage = material_file_storage()
+    if hasattr(storage, "bucket_name"):
+        return S3Backend(storage)
+    return LocalBackend(storage)
+
+
+def _lock_material_file(name):
+    MaterialFileLock.objects.select_for_update().get_or_create(name=name)
+
+
+def release_material_file(name):
+    """Delete ``name`` once no Material references it.
+
+    Only content-addressed storage shares files between rows; with plain
+    storage files are left in place, as before. The check and the delete run
+    under the file's lock row, the same one ``claim_material_file`` takes.
+    """
+    storage = material_file_storage()
+    if not name or not getattr(storage, "content_addressed", False):
+        return
+
+    def release():
+        with transaction.atomic():
+            _lock_material_file(name)
+            if not Material.objects.filter(upload=name).exists():
+                storage.delete(name)
+                MaterialFileLock.objects.filter(name=name).delete()
+
+    transaction.on_commit(release)
+
+
+def claim_material_file(name, content=None):
+    """Check that ``name`` is still stored now that a Material row points at it.
+
+    Content-addressed storage returns an existing file without writing it, so
+    a release that had already found no references may delete it before the
+    new row is visible. Under the lock a release either ran first (the file is
+    gone and is written again from ``content``) or runs later and sees the row.
+    Raises MaterialFileMissing when the file is gone and there is no content.
+    """
+    storage = material_file_storage()
+    if not name or not getattr(storage, "content_addressed", False):
+        return
+    with transaction.atomic():
+        _lock_material_file(name)
+        if storage.exists(name):
+            return
+        try:
+            # A temporary upload may already have been moved into place (and deleted).
+            rewritten = content is not None and not content.closed and storage.save(name, content) == name
+        except OSError:
+            rewritten = False
+        if not rewritten:
+            raise MaterialFileMissing("The stored file was removed; start the upload again.")
+
+
+def start_upload(course, owner, title, filename, size) -> UploadSession:
+    filename = os.path.basename(filename or "")
+    if os.path.splitext(filename)[1].lower() not in MATERIAL_EXTENSIONS:
+        raise UploadError("Unsupported file type.")
+    if size <= 0:
+        raise UploadError("Empty file.")
+    if size > material_max_upload_size():
+        raise UploadError(f"File too large (max {material_max_upload_size() // 1024 ** 2} MB).")
+
+    backend = get_backend()
+    chunk_size = upload_chunk_size()
+    if isinstance(backend, S3Backend):
+        chunk_size = max(chunk_size, S3_MIN_PART_SIZE)
+    session = UploadSession(
+        course=course, owner=owner, title=(title or filename)[:200], filename=filename, size=size,
+        chunk_size=chunk_size,
+        storage_name=Material._meta.get_field("upload").generate_filename(None, filename),
+    )
+    backend.start(session)
+    session.save()
+    return session
+
+
+def _locked_session(session_id, owner, offset):
+    session = (
+        UploadSession.objects.select_for_update()
+        .select_related("course")
+        .get(pk=session_id, owner=owner)
+    )
+    if session.status != UploadSession.ACTIVE:
+        raise UploadError("Upload is no longer active.")
+    if offset != session.received:
+        raise OffsetMismatch("Chunk does not start at the resume offset.")
+    return session
+
+
+def _claim(session_id, owner, offset, length) -> UploadSession:
+    with transaction.atomic():
+        session = _locked_session(session_id, owner, offset)
+        expected = min(session.chunk_size, session.size - offset)
+        if length != expected:
+            raise UploadError(f"Chunk must be {expected} bytes.")
+        now = timezone.now()
+        expires = session.claimed_at + timedelta(seconds=upload_claim_timeout()) if session.claim else now
+        if expires > now:
+            exc = OffsetMismatch("Another request is writing this chunk.")
+            # Usually the other request finishes well before its claim expires; check back soon.
+            exc.retry_after = min(int((expires - now).total_seconds()) + 1, 30)
+            raise exc
+        session.claim, session.claimed_at = uuid.uuid4(), now
+        session.save(update_fields=["claim", "claimed_at", "updated_at"])
+    return session
+
+
+def _release_claim(session):
+    UploadSession.objects.filter(pk=session.pk, claim=session.claim).update(claim=None, claimed_at=None)
+
+
+def receive_chunk(session_id, owner, offset, length, stream) -> UploadSession:
+    """Store ``length`` bytes from ``stream`` at ``offset``; finalize after the last chunk."""
+    claimed = _claim(session_id, owner, offset, length)
+
+    backend = get_backend()
+    try:
+        if backend.write(claimed, offset, stream, length) != length:
+            raise UploadError("Chunk body ended early.")
+        storage_name = backend.complete(claimed) if offset + length == claimed.size else None
+    except Exception:
+        _release_claim(claimed)
+        raise
+
+    try:
+        with transaction.atomic():
+            session = _locked_session(session_id, owner, offset)
+            if session.claim != claimed.claim:
+                raise OffsetMismatch("The claim on this chunk expired.")
+            session.received += length
+            session.parts = claimed.parts
+            session.claim = session.claimed_at = None
+            if storage_name is not None:
+                session.storage_name = storage_name
+                session.material = Material.objects.create(
+                    course=session.course, title=session.title, upload=storage_name,
+                )
+                session.status = UploadSession.COMPLETE
+                enqueue(notify_material_uploaded, session.material.id, owner.id)
+            session.save()
+    except MaterialFileMissing:
+        # The assembled file is gone with it; the session cannot be resumed.
+        abort_upload(claimed)
+        raise
+    return session
+
+
+def abort_upload(session):
+    get_backend().abort(session)
+    session.status = UploadSession.ABORTED
+    session.save(update_fields=["status", "updated_at"])
@@ -1,22 +1,44 @@
 from django.urls import path
 from .views import (
     course_list,
+    course_search,
     course_detail,
+    course_materials_page,
+    course_feedback_page,
+    course_export,
     course_create,
     enroll_in_course,
     unenroll_student,
     material_upload,
+    material_upload_start,
+    material_upload_session,
+    material_download,
+    material_contents,
+    material_member,
     give_feedback,
     post_status,
+    activity_feed,
 )
 
 urlpatterns = [
-    path("", course_list, name="course_list"),
+    path("courses/", course_list, name="course_list"),
+    path("courses/search/", course_search, name="course_search"),
     path("<int:course_id>/", course_detail, name="course_detail"),
+    path("<int:course_id>/materials/page/", course_materials_page, name="course_materials_page"),
+    path("<int:course_id>/feedback/page/", course_feedback_page, name="course_feedback_page"),
+    path("<int:course_id>/export/<slug:kind>.<slug:fmt>", course_export, name="course_export"),
     path("create/", course_create, name="course_create"),
     path("<int:course_id>/enroll/", enroll_in_course, name="enroll"),
     path("<int:course_id>/unenroll/<int:student_id>/", unenroll_student, name="unenroll_student"),
     path("<int:course_id>/materials/upload/", material_upload, name="material_upload"),
+    path("<int:course_id>/materials/uploads/", material_upload_start, name="material_upload_start"),
+    path("<int:course_id>/materials/uploads/<uuid:session_id>/", material_upload_session,
+         name="material_upload_session"),
+    path("<int:course_id>/materials/<int:material_id>/download/", material_download, name="material_download"),
+    path("<int:course_id>/materials/<int:material_id>/contents/", material_contents, name="material_contents"),
+    path("<int:course_id>/materials/<int:material_id>/contents/<int:entry_id>/", material_member,
+         name="material_member"),
     path("<int:course_id>/feedback/", give_feedback, name="give_feedback"),
     path("status/", post_status, name="post_status"),
+    path("feed/", activity_feed, name="activity_feed"),
 ]
@@ -1,13 +1,35 @@
+import mimetypes
+import posixpath
+import re
+
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Prefetch
-from django.http import HttpResponseForbidden
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from django.utils.safestring import mark_safe
 from django.shortcuts import render, redirect, get_object_or_404
-from accounts.models import Block
-from .models import Course, Enrollment, Material, Feedback
+from .models import Course, Enrollment, Feedback, Material, MaterialArchive, MaterialArchiveEntry, UploadSession
 from .forms import CourseForm, MaterialForm, FeedbackForm, StatusUpdateForm
-from accounts.notify import create_and_push
+from accounts.notify import coalesce_and_push
+from jobs.queue import enqueue
+from elearning.export import EXPORT_FORMATS, streaming_export
+from elearning.keyset import InvalidCursor
+from .access import is_blocked, is_enrolled
+from .archives import ArchiveError, member_stream
+from .catalog import AVAILABLE_SORTS, available_courses_page, catalog_page_html
+from .downloads import serve_material, stream_blocks
+from .feed import feed_page
+from .pages import course_page, course_roster_html, detail_list_html
+from .search import search_courses
+from .tasks import notify_material_uploaded
+from .uploads import UploadError, abort_upload, material_max_upload_size, receive_chunk, start_upload
 from django.urls import reverse
 from django.db.models.fields.files import FileField, ImageField
 from django.db import transaction
@@ -24,24 +46,32 @@ def is_student(user):
 @login_required
 def dashboard_view(request):
     status_form = StatusUpdateForm()
+    feed, feed_cursor = feed_page(request.user)
     if is_teacher(request.user):
         courses = Course.objects.filter(instructor=request.user)
         return render(request, "dashboard/teacher_dashboard.html", {
             "courses": courses,
             "status_form": status_form,
+            "feed": feed,
+            "feed_cursor": feed_cursor,
         })
     else:
         enrollments = Enrollment.objects.filter(student=request.user).select_related("course")
-        enrolled_courses = [e.course for e in enrollments]
-        blocked_teacher_ids = Block.objects.filter(blocked=request.user).values_list("teacher_id", flat=True)
-        available_courses = (
-            Course.objects.exclude(pk__in=[c.pk for c in enrolled_courses])
-                          .exclude(instructor_id__in=blocked_teacher_ids)
-        )
+        sort = request.GET.get("sort")
+        if sort not in AVAILABLE_SORTS:
+            sort = "newest"
+        try:
+            available_courses, next_cursor = available_courses_page(request.user, sort, request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404
         return render(request, "dashboard/student_dashboard.html", {
             "enrollments": enrollments,
             "available_courses": available_courses,
+            "next_cursor": next_cursor,
+            "sort": sort,
             "status_form": status_form,
+            "feed": feed,
+            "feed_cursor": feed_cursor,
         })
 
 @login_required
@@ -57,6 +87,14 @@ def post_status(request):
             messages.error(request, "Could not post status.")
     return redirect("home")
 
+@login_required
+def activity_feed(request):
+    try:
+        feed, next_cursor = feed_page(request.user, request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404
+    return render(request, "courses/activity_feed.html", {"feed": feed, "next_cursor": next_cursor})
+
 # ---------- COURSES ----------
 @login_required
 def course_create(request):
@@ -76,33 +114,84 @@ def course_create(request):
 
 @login_required
 def course_list(request):
-    courses = Course.objects.all().order_by("-created_at")
-    return render(request, "courses/course_list.html", {"courses": courses})
+    try:
+        catalog_html = catalog_page_html(request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404
+    return render(request, "courses/course_list.html", {"catalog_html": mark_safe(catalog_html)})
+
+@login_required
+def course_search(request):
+    q = (request.GET.get("q") or "").strip()
+    page_obj = None
+    if q:
+        paginator = Paginator(search_courses(q), getattr(settings, "CATALOG_PAGE_SIZE", 25))
+        page_obj = paginator.get_page(request.GET.get("page"))
+    return render(request, "courses/course_search.html", {"q": q, "page_obj": page_obj})
 
 @login_required
 def course_detail(request, course_id):
-    course = get_object_or_404(
-        Course.objects.select_related("instructor")
-                      .prefetch_related(
-                          "materials",
-                          Prefetch("feedbacks", queryset=Feedback.objects.select_related("student").order_by("-created_at"))
-                      ),
-        pk=course_id
-    )
-    enrolled = Enrollment.objects.filter(course=course, student=request.user).exists()
+    course = course_page(course_id)
+    enrolled = is_enrolled(request.user, course)
     is_instructor = is_teacher(request.user) and course.instructor_id == request.user.id
-    roster = []
-    if is_instructor:
-        roster = Enrollment.objects.filter(course=course).select_related("student").order_by("student__username")
+    roster_html = course_roster_html(course) if is_instructor else ""
     can_chat = is_instructor or enrolled
     return render(request, "courses/course_detail.html", {
         "course": course,
+        "materials_html": mark_safe(detail_list_html(course.id, "materials")),
+        "feedback_html": mark_safe(detail_list_html(course.id, "feedback")),
+        "roster_html": mark_safe(roster_html),
         "enrolled": enrolled,
         "is_instructor": is_instructor,
-        "roster": roster,
         "can_chat": can_chat,
     })
 
+def _detail_list(request, course_id, kind):
+    course = course_page(course_id)
+    try:
+        html = detail_list_html(course.id, kind, request.GET.get("cursor"))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return HttpResponse(html)
+
+@login_required
+def course_materials_page(request, course_id):
+    return _detail_list(request, course_id, "materials")
+
+@login_required
+def course_feedback_page(request, course_id):
+    return _detail_list(request, course_id, "feedback")
+
+# Course exports: (header, queryset factory) with rows in a stable, indexed order.
+# kind -> (header, queryset, fields, ordering). Each ordering is total and
+# index-backed: the course FK index ends in the pk, and feedback has
+# (course, created_at).
+COURSE_EXPORTS = {
+    "roster": (
+        ["student_id", "username", "email", "enrolled_at"],
+        lambda course: Enrollment.objects.filter(course=course),
+        ("student_id", "student__username", "student__email", "enrolled_at"),
+        ("id",),
+    ),
+    "feedback": (
+        ["id", "student_id", "username", "created_at", "content"],
+        lambda course: Feedback.objects.filter(course=course),
+        ("id", "student_id", "student__username", "created_at", "content"),
+        ("created_at", "id"),
+    ),
+}
+
+@login_required
+def course_export(request, course_id, kind, fmt):
+    """Instructor download of a course's roster or feedback as CSV / JSON Lines."""
+    if kind not in COURSE_EXPORTS or fmt not in EXPORT_FORMATS:
+        raise Http404
+    course = course_page(course_id)
+    if not (is_teacher(request.user) and course.instructor_id == request.user.id):
+        return HttpResponseForbidden()
+    header, rows, fields, ordering = COURSE_EXPORTS[kind]
+    return streaming_export(header, rows(course), fields, ordering, fmt, f"course-{course.id}-{kind}")
+
 @login_required
 def enroll_in_course(request, course_id):
     if not is_student(request.user):
@@ -110,7 +199,7 @@ def enroll_in_course(request, course_id):
 
     course = get_object_or_404(Course, pk=course_id)
 
-    if Block.objects.filter(teacher=course.instructor, blocked=request.user).exists():
+    if is_blocked(request.user, course):
         messages.error(request, "You cannot enroll: the instructor has blocked you.")
         return redirect("course_detail", course_id=course.id)
 
@@ -121,9 +210,9 @@ def enroll_in_course(request, course_id):
 
     if created:
         url = reverse("course_detail", kwargs={"course_id": course.id})
-        create_and_push(
+        coalesce_and_push(
             recipient=course.instructor,
-            verb=f"{request.user.username} enrolled in {course.title}",
+            verb_template="{actors} enrolled in " + course.title.replace("{", "{{").replace("}", "}}"),
             url=url,
             actor=request.user,
         )
@@ -155,26 +244,9 @@ def material_upload(request, course_id):
         return HttpResponseForbidden()
 
     course = get_object_or_404(Course, pk=course_id, instructor=request.user)
-    User = get_user_model()
 
     def notify_students(material):
-        url = reverse("course_detail", kwargs={"course_id": course.id})
-        student_ids = list(
-            Enrollment.objects.filter(course=course)
-            .exclude(student_id=request.user.id)
-            .values_list("student_id", flat=True)
-        )
-        if not student_ids:
-            return
-
-        for student in User.objects.only("id", "username").filter(id__in=student_ids):
-            create_and_push(
-                recipient=student,
-                verb=f"New material in {course.title}: "
-                     f"{getattr(material, 'title', '') or getattr(material, 'upload', None) or 'File'}",
-                url=url,
-                actor=request.user,
-            )
+        enqueue(notify_material_uploaded, material.id, request.user.id)
 
     if request.method == "POST":
         form = MaterialForm(request.POST, request.FILES)
@@ -209,7 +281,128 @@ def material_upload(request, course_id):
 
     # GET
     form = MaterialForm()
-    return render(request, "courses/material_form.html", {"form": form, "course": course})
+    return render(request, "courses/material_form.html", {
+        "form": form,
+        "course": course,
+        "max_upload_size": material_max_upload_size(),
+    })
+
+def _upload_json(session):
+    data = {
+        "id": str(session.id),
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "received": session.received,
+        "status": session.status,
+        "url": reverse("material_upload_session", args=[session.course_id, session.id]),
+    }
+    if session.material_id:
+        data["material_id"] = session.material_id
+        data["redirect"] = reverse("course_detail", args=[session.course_id])
+    return data
+
+@login_required
+@require_POST
+def material_upload_start(request, course_id):
+    """Open a chunked upload session: ``title``, ``filename`` and ``size`` in the POST body."""
+    if not is_teacher(request.user):
+        return HttpResponseForbidden()
+    course = get_object_or_404(Course, pk=course_id, instructor=request.user)
+    try:
+        size = int(request.POST.get("size", ""))
+    except ValueError:
+        return JsonResponse({"error": "size is required."}, status=400)
+    try:
+        session = start_upload(course, request.user, request.POST.get("title"), request.POST.get("filename"), size)
+    except UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+    return JsonResponse(_upload_json(session), status=201)
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+@login_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def material_upload_session(request, course_id, session_id):
+    """GET: resume offset. PUT: one chunk with ``Content-Range``. DELETE: abort."""
+    session = get_object_or_404(UploadSession, pk=session_id, course_id=course_id, owner=request.user)
+    if request.method == "GET":
+        return JsonResponse(_upload_json(session))
+    if request.method == "DELETE":
+        if session.status == UploadSession.ACTIVE:
+            abort_upload(session)
+        return JsonResponse(_upload_json(session))
+
+    m = _CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+    if not m or int(m.group(3)) != session.size:
+        return JsonResponse({"error": "Content-Range: bytes start-end/size is required."}, status=400)
+    start, end = int(m.group(1)), int(m.group(2))
+    length = end - start + 1
+    if length <= 0 or int(request.META.get("CONTENT_LENGTH") or 0) != length:
+        return JsonResponse({"error": "Content-Length does not match Content-Range."}, status=400)
+    try:
+        session = receive_chunk(session.id, request.user, start, length, request)
+    except UploadError as exc:
+        session.refresh_from_db()
+        response = JsonResponse({"error": str(exc), **_upload_json(session)}, status=exc.status)
+        if exc.retry_after:
+            response["Retry-After"] = str(exc.retry_after)
+        return response
+    return JsonResponse(_upload_json(session))
+
+def _readable_material(request, course_id, material_id):
+    """A course's material, for its instructor and enrolled students only."""
+    course = course_page(course_id)
+    if course.instructor_id != request.user.id and not is_enrolled(request.user, course):
+        raise PermissionDenied
+    return get_object_or_404(
+        Material.objects.only("id", "course_id", "title", "upload"), pk=material_id, course_id=course.id
+    )
+
+@login_required
+@require_safe
+def material_download(request, course_id, material_id):
+    return serve_material(request, _readable_material(request, course_id, material_id))
+
+@login_required
+@require_safe
+def material_contents(request, course_id, material_id):
+    """Member listing of a ZIP material, once the indexing job has run."""
+    material = _readable_material(request, course_id, material_id)
+    if not material.is_archive:
+        raise Http404
+    archive = MaterialArchive.objects.filter(material=material).first()
+    page_obj = None
+    if archive and archive.status == MaterialArchive.READY:
+        paginator = Paginator(archive.entries.all(), getattr(settings, "MATERIAL_ARCHIVE_PAGE_SIZE", 100))
+        page_obj = paginator.get_page(request.GET.get("page"))
+    return render(request, "courses/material_contents.html", {
+        "material": material,
+        "archive": archive,
+        "page_obj": page_obj,
+    })
+
+@login_required
+@require_safe
+def material_member(request, course_id, material_id, entry_id):
+    """One file out of a ZIP material, streamed from a range read of the archive.
+
+    The body is an async iterator so that under ASGI each block goes out as
+    it is inflated instead of the whole member being collected first.
+    """
+    material = _readable_material(request, course_id, material_id)
+    entry = get_object_or_404(
+        MaterialArchiveEntry, pk=entry_id, archive__material=material, archive__status=MaterialArchive.READY
+    )
+    try:
+        stream = member_stream(material, entry)
+    except ArchiveError as exc:
+        return HttpResponse(str(exc), status=415)
+    response = StreamingHttpResponse(
+        stream_blocks(stream), content_type=mimetypes.guess_type(entry.name)[0] or "application/octet-stream"
+    )
+    response["Content-Length"] = str(entry.size)
+    response["Content-Disposition"] = content_disposition_header(True, posixpath.basename(entry.name))
+    return response
 
 @login_required
 def give_feedback(request, course_id):
@@ -217,7 +410,7 @@ def give_feedback(request, course_id):
         return HttpResponseForbidden()
     course = get_object_or_404(Course, pk=course_id)
 
-    if not Enrollment.objects.filter(course=course, student=request.user).exists():
+    if not is_enrolled(request.user, course):
         messages.error(request, "You must be enrolled to leave feedback.")
         return redirect("course_detail", course_id=course.id)
 
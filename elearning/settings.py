@@ -33,6 +33,8 @@ INSTALLED_APPS = [
     'courses',
     'chat',
     'api',
+    'jobs',
+    'analytics',
 ]
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
@@ -47,7 +49,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset cursors on every list endpoint; see api/pagination.py.
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
+API_MAX_PAGE_SIZE = 200         # upper bound for ?page_size=
+API_MAX_RANKED_RESULTS = 1000   # search results reachable by paging
 
 
 AUTH_USER_MODEL = 'accounts.User'
@@ -132,8 +139,11 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
 
 
-# Channels
-if DEBUG:
+# Channels. Pushes sent from `manage.py run_jobs` (new-material notifications,
+# trailing coalesced pushes) only reach browsers through a layer shared with the
+# web process, i.e. Redis. The in-memory layer is per process: with it, set
+# JOBS_EAGER=1 so those jobs run in the web process, or set REDIS_URL.
+if DEBUG and not os.getenv("REDIS_URL"):
     CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 else:
     CHANNEL_LAYERS = {
@@ -143,6 +153,91 @@ else:
         }
     }
 
+# Cache. Required to be shared by every web and worker process outside DEBUG:
+# course access, the catalog and the course detail fragments are invalidated by
+# bumping version tokens in the cache, and a per-process LocMemCache would keep
+# serving stale pages (and stale access decisions) from the other processes.
+# Redis is already deployed for the channel layer.
+if DEBUG or RUNNING_TESTS:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_CACHE_URL", os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")),
+            "KEY_PREFIX": "elearning",
+        }
+    }
+
+# Background jobs. Run `python manage.py run_jobs` to process the queue, or set
+# JOBS_EAGER=1 to run jobs inline right after the request's transaction commits.
+JOBS_EAGER = RUNNING_TESTS or os.getenv("JOBS_EAGER", "0") == "1"
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_POLL_INTERVAL = 1.0
+# A running job's worker renews its heartbeat this often (seconds); a job whose
+# heartbeat is older than JOBS_STALE_AFTER is requeued, or failed if out of attempts.
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_STALE_AFTER = 300
+# The worker requeues stale jobs and prunes finished ones this often (seconds).
+JOBS_MAINTENANCE_INTERVAL = 60
+JOBS_DONE_RETENTION = 7 * 24 * 3600
+
+# Notification coalescing: similar events within the window share one row, and
+# live pushes for a group are sent at most once per interval.
+NOTIFICATION_COALESCE_WINDOW = 3600
+NOTIFICATION_PUSH_INTERVAL = 10
+# Read notifications older than this are removed by `manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Seconds a cached (user, course) block/enrollment lookup stays valid.
+COURSE_ACCESS_CACHE_TIMEOUT = 300
+
+# Messages per chat history page (initial render and scroll-back).
+CHAT_HISTORY_PAGE_SIZE = 50
+# Most messages replayed to a reconnecting chat socket.
+CHAT_REPLAY_LIMIT = 500
+
+# Course catalog: keyset page size and how long rendered pages stay cached.
+CATALOG_PAGE_SIZE = 25
+CATALOG_CACHE_TIMEOUT = 300
+
+# Upper bound on how long cached course detail fragments live (they are also versioned).
+COURSE_PAGE_CACHE_TIMEOUT = 300
+# Materials / feedback items per lazily loaded page on the course detail view.
+COURSE_DETAIL_PAGE_SIZE = 20
+
+# `manage.py rollup_stats` leaves rows newer than this for the next run, so a
+# transaction still open when the run starts cannot commit below the watermark.
+ROLLUP_SETTLE_SECONDS = 300
+
+# Rows fetched per database round trip by the streaming CSV/JSONL exports.
+EXPORT_CHUNK_SIZE = 2000
+
+# Upper bound on rows accepted by one bulk enrollment request.
+BULK_ENROLL_MAX_ROWS = 10000
+
+# Activity feed: updates per page, and the course size above which a status is
+# stored once per course and merged on read instead of copied to every inbox.
+FEED_PAGE_SIZE = 20
+FEED_FANOUT_MAX_AUDIENCE = 1000
+
+# Material uploads: the plain form is buffered by Django and stays small; the
+# chunked upload protocol streams each chunk to storage (S3 parts >= 5 MB).
+MATERIAL_FORM_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+MATERIAL_MAX_UPLOAD_SIZE = int(os.getenv("MATERIAL_MAX_UPLOAD_SIZE", str(2 * 1024 ** 3)))
+MATERIAL_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MATERIAL_UPLOAD_SESSION_TTL = 24 * 3600
+# How long a chunk write holds the session's offset before another request may retry it.
+MATERIAL_UPLOAD_CLAIM_TIMEOUT = 15 * 60
+# ZIP materials are indexed after upload so members can be listed and fetched one by one.
+MATERIAL_ARCHIVE_MAX_MEMBERS = 10000
+MATERIAL_ARCHIVE_PAGE_SIZE = 100
+
+# Chat write-behind: buffer incoming messages and persist them in batches.
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "0") == "1"
+CHAT_WRITE_BEHIND_BATCH = int(os.getenv("CHAT_WRITE_BEHIND_BATCH", "200"))
+CHAT_WRITE_BEHIND_DELAY = float(os.getenv("CHAT_WRITE_BEHIND_DELAY", "0.5"))
+
 
 STORAGES = {
     "staticfiles": {
@@ -170,5 +265,26 @@ else:
     MEDIA_URL = "/media/"
     MEDIA_ROOT = BASE_DIR / "media"
 
+# Optional content-addressed storage for course materials: identical uploads
+# are stored once and shared; `manage.py dedupe_materials` converts old files.
+MATERIAL_DEDUPE = os.getenv("MATERIAL_DEDUPE", "0") == "1"
+if MATERIAL_DEDUPE:
+    STORAGES["materials"] = {
+        "BACKEND": "elearning.storage_backends.ContentAddressed"
+                   + ("S3Storage" if USE_S3 else "FileSystemStorage"),
+    }
+elif USE_S3:
+    STORAGES["materials"] = {"BACKEND": "elearning.storage_backends.MaterialS3Storage"}
+else:
+    STORAGES["materials"] = STORAGES["default"]
+
+# Material downloads on local storage: when set, the app checks access and hands
+# the file to the front end with an X-Accel-Redirect to this internal prefix
+# (an nginx `internal` location aliased to MEDIA_ROOT) instead of sending it.
+MATERIAL_ACCEL_REDIRECT = os.getenv("MATERIAL_ACCEL_REDIRECT", "")
+MATERIAL_ACCEL_HEADER = os.getenv("MATERIAL_ACCEL_HEADER", "X-Accel-Redirect")
+# Lifetime in seconds of the presigned URLs that S3-stored material downloads redirect to.
+MATERIAL_URL_EXPIRE = int(os.getenv("MATERIAL_URL_EXPIRE", "300"))
+
 
 
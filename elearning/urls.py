@@ -14,6 +14,7 @@ urlpatterns = [
     # App routes
     path("", include("courses.urls")),
     path("", include("chat.urls")),
+    path("", include("analytics.urls")),
 
     # API
     path("api/", include("api.urls")),
@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.queue import claim, heartbeat, job_stats, prune_done, requeue_stale, run
+
+
+def _run_in_thread(job_obj):
+    try:
+        return run(job_obj)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=getattr(settings, "JOBS_WORKERS", 4))
+        parser.add_argument("--poll", type=float, default=getattr(settings, "JOBS_POLL_INTERVAL", 1.0))
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+        parser.add_argument("--stats", action="store_true", help="Print per-job timing metrics and exit.")
+
+    def handle(self, *args, **opts):
+        if opts["stats"]:
+            return self._print_stats()
+
+        workers = max(1, opts["workers"])
+        interval = getattr(settings, "JOBS_MAINTENANCE_INTERVAL", 60)
+        beat = getattr(settings, "JOBS_HEARTBEAT_INTERVAL", 30)
+        next_maintenance = next_beat = 0.0
+        done = failed = 0
+        running = {}  # future -> job id
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job") as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    now = time.monotonic()
+                    if now >= next_maintenance:
+                        self._maintain()
+                        next_maintenance = now + interval
+                    if running and now >= next_beat:
+                        heartbeat(running.values())
+                        next_beat = now + beat
+                    # Each job starts as soon as a thread is free; a slow one holds only its own thread.
+                    free = workers - len(running)
+                    for job_obj in claim(limit=free) if free else []:
+                        running[pool.submit(_run_in_thread, job_obj)] = job_obj.pk
+                    if not running:
+                        if opts["once"]:
+                            break
+                        time.sleep(opts["poll"])
+                        continue
+                    finished, _ = wait(running, timeout=opts["poll"], return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        del running[future]
+                        ok = future.result()
+                        done += ok
+                        failed += not ok
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(f"Jobs finished: {done} ok, {failed} failed.")
+
+    def _maintain(self):
+        """Take back jobs orphaned by a dead worker and drop old finished ones."""
+        stale = requeue_stale(getattr(settings, "JOBS_STALE_AFTER", 300))
+        if stale:
+            self.stdout.write(f"Took back {stale} stale job(s).")
+        pruned = prune_done(getattr(settings, "JOBS_DONE_RETENTION", 7 * 24 * 3600))
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} finished job(s).")
+
+    def _print_stats(self):
+        for row in job_stats():
+            self.stdout.write(
+                f"{row['name']}: total={row['total']} done={row['done']} failed={row['failed']} "
+                f"queued={row['queued']} avg_ms={row['avg_ms'] or 0:.1f} max_ms={row['max_ms'] or 0:.1f}"
+            )
@@ -0,0 +1,159 @@
+"""Small DB-backed job queue.
+
+Any importable module-level function can be a job. ``enqueue`` records it in
+the ``Job`` table once the current transaction commits; ``manage.py run_jobs``
+claims queued rows and runs them on a thread pool, retrying failures with
+exponential backoff. While a job runs its worker renews ``heartbeat_at``;
+only a job whose heartbeat stopped (its worker died) is taken back. With ``JOBS_EAGER`` the job runs inline after commit
+instead, which is what the test suite and single-process setups use.
+"""
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def job(func=None, *, max_attempts=3):
+    """Mark a function as a job and set its retry budget."""
+    def wrap(f):
+        f.job_max_attempts = max_attempts
+        return f
+    return wrap(func) if func is not None else wrap
+
+
+def job_name(func) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _is_eager() -> bool:
+    return getattr(settings, "JOBS_EAGER", False)
+
+
+def enqueue(func, *args, delay: float = 0, on_commit: bool = True, **kwargs):
+    """Schedule ``func(*args, **kwargs)`` to run off the request path.
+
+    Arguments must be JSON-serialisable. By default nothing is queued unless
+    the surrounding transaction commits.
+    """
+    name = job_name(func)
+
+    def dispatch():
+        if _is_eager():
+            func(*args, **kwargs)
+            return
+        Job.objects.create(
+            name=name,
+            args=list(args),
+            kwargs=kwargs,
+            max_attempts=getattr(func, "job_max_attempts", 3),
+            run_after=timezone.now() + timedelta(seconds=delay),
+        )
+
+    if on_commit:
+        transaction.on_commit(dispatch)
+    else:
+        dispatch()
+
+
+def claim(limit: int = 1) -> list:
+    """Atomically move up to ``limit`` due jobs from queued to running."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    claimed = []
+    for pk in candidates:
+        # Conditional update: only one worker can win the row.
+        won = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1,
+        )
+        if won:
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed))
+
+
+def run(job_obj) -> bool:
+    """Execute a claimed job and record the outcome. Returns True on success."""
+    start = time.perf_counter()
+    try:
+        func = import_string(job_obj.name)
+        func(*job_obj.args, **job_obj.kwargs)
+    except Exception:
+        elapsed = (time.perf_counter() - start) * 1000
+        retry = job_obj.attempts < job_obj.max_attempts
+        Job.objects.filter(pk=job_obj.pk).update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_after=timezone.now() + timedelta(seconds=2 ** job_obj.attempts),
+            last_error=traceback.format_exc(),
+            finished_at=None if retry else timezone.now(),
+            duration_ms=elapsed,
+        )
+        logger.exception("Job %s #%s failed (attempt %s/%s)",
+                         job_obj.name, job_obj.pk, job_obj.attempts, job_obj.max_attempts)
+        return False
+
+    elapsed = (time.perf_counter() - start) * 1000
+    Job.objects.filter(pk=job_obj.pk).update(
+        status=Job.DONE, finished_at=timezone.now(), duration_ms=elapsed, last_error="",
+    )
+    logger.info("Job %s #%s done in %.1f ms", job_obj.name, job_obj.pk, elapsed)
+    return True
+
+
+def heartbeat(ids) -> int:
+    """Renew the lease on jobs this worker is still running."""
+    return Job.objects.filter(pk__in=list(ids), status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(older_than: float) -> int:
+    """Take back jobs whose worker stopped sending heartbeats ``older_than`` seconds ago.
+
+    A job with attempts left is queued again; one that is out of attempts is
+    marked failed. Returns the number of jobs taken back.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error="Worker stopped while running the job.",
+    )
+    return failed + stale.update(status=Job.QUEUED)
+
+
+def prune_done(older_than: float, batch_size: int = 1000) -> int:
+    """Delete finished jobs older than ``older_than`` seconds. Failed ones are kept for inspection."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    done = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff)
+    total = 0
+    while True:
+        ids = list(done.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def job_stats() -> list:
+    """Per-job-name counts and timings, for the worker's ``--stats`` output."""
+    return list(
+        Job.objects.values("name")
+        .annotate(
+            total=Count("id"),
+            done=Count("id", filter=Q(status=Job.DONE)),
+            failed=Count("id", filter=Q(status=Job.FAILED)),
+            queued=Count("id", filter=Q(status=Job.QUEUED)),
+            avg_ms=Avg("duration_ms"),
+            max_ms=Max("duration_ms"),
+        )
+        .order_by("name")
+    )
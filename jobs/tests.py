@@ -0,0 +1,110 @@
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import claim, enqueue, heartbeat, job, job_stats, prune_done, requeue_stale, run
+
+CALLS = []
+
+
+@job(max_attempts=2)
+def record(value):
+    CALLS.append(value)
+
+
+def explode():
+    raise RuntimeError("boom")
+
+
+def slow():
+    time.sleep(0.3)
+    CALLS.append("slow")
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, 1)
+            self.assertFalse(Job.objects.exists())
+        j = Job.objects.get()
+        self.assertEqual((j.name, j.args, j.max_attempts), ("jobs.tests.record", [1], 2))
+
+    def test_claim_and_run(self):
+        enqueue(record, "x", on_commit=False)
+        [j] = claim(limit=5)
+        self.assertEqual((j.status, j.attempts), (Job.RUNNING, 1))
+        self.assertEqual(claim(limit=5), [])
+        self.assertTrue(run(j))
+        j.refresh_from_db()
+        self.assertEqual(j.status, Job.DONE)
+        self.assertIsNotNone(j.duration_ms)
+        self.assertEqual(CALLS, ["x"])
+
+    def test_failure_retries_then_fails(self):
+        enqueue(explode, on_commit=False)
+        for expected in (Job.QUEUED, Job.QUEUED, Job.FAILED):
+            Job.objects.update(run_after=timezone.now())
+            [j] = claim()
+            self.assertFalse(run(j))
+            j.refresh_from_db()
+            self.assertEqual(j.status, expected)
+        self.assertIn("boom", j.last_error)
+        [row] = job_stats()
+        self.assertEqual((row["name"], row["failed"]), ("jobs.tests.explode", 1))
+
+    def test_delayed_job_is_not_claimed_early(self):
+        enqueue(record, 1, delay=60, on_commit=False)
+        self.assertEqual(claim(), [])
+
+    def test_requeue_stale(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Job.objects.create(name="a", status=Job.RUNNING, attempts=1, started_at=hour_ago, heartbeat_at=hour_ago)
+        spent = Job.objects.create(name="b", status=Job.RUNNING, attempts=3, started_at=hour_ago, heartbeat_at=hour_ago)
+        # Started long ago but its worker is still renewing the lease.
+        alive = Job.objects.create(name="c", status=Job.RUNNING, attempts=1, started_at=hour_ago, heartbeat_at=hour_ago)
+        heartbeat([alive.pk])
+        self.assertEqual(requeue_stale(600), 2)
+        statuses = dict(Job.objects.values_list("name", "status"))
+        self.assertEqual(statuses, {"a": Job.QUEUED, "b": Job.FAILED, "c": Job.RUNNING})
+        self.assertIn("Worker stopped", Job.objects.get(pk=spent.pk).last_error)
+
+    def test_prune_done_keeps_recent_and_failed(self):
+        old = timezone.now() - timedelta(days=30)
+        Job.objects.create(name="a", status=Job.DONE, finished_at=old)
+        Job.objects.create(name="b", status=Job.DONE, finished_at=timezone.now())
+        Job.objects.create(name="c", status=Job.FAILED, finished_at=old)
+        self.assertEqual(prune_done(7 * 24 * 3600, batch_size=1), 1)
+        self.assertEqual(sorted(Job.objects.values_list("name", flat=True)), ["b", "c"])
+
+
+@override_settings(JOBS_EAGER=False)
+class WorkerTests(TransactionTestCase):
+    # The worker's threads use their own connections, so the jobs must be committed.
+    def setUp(self):
+        CALLS.clear()
+
+    def test_worker_does_not_wait_for_the_whole_batch(self):
+        enqueue(slow, on_commit=False)
+        enqueue(record, "fast", on_commit=False)
+        call_command("run_jobs", workers=2, poll=0.01, once=True, stdout=StringIO())
+        self.assertEqual(CALLS, ["fast", "slow"])
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {Job.DONE})
+
+
+class EagerJobTests(TestCase):
+    def test_eager_runs_inline_after_commit(self):
+        CALLS.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, 7)
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [7])
+        self.assertFalse(Job.objects.exists())